@@ -1,6 +1,21 @@
 from .archaic import Mapper
+from .cache import QueryCache
+from .changes import Change, ChangeFeed, Watermark, WatermarkStore
+from .observe import Event, Stats, log_events
+from .writer import Writer
 
 
-__all__ = ["Mapper"]
+__all__ = [
+    "Mapper",
+    "QueryCache",
+    "Change",
+    "ChangeFeed",
+    "Watermark",
+    "WatermarkStore",
+    "Event",
+    "Stats",
+    "log_events",
+    "Writer",
+]
 
 __version__ = "0.2.8"
@@ -1,27 +1,49 @@
-import arcpy
 import ast
+import json
+import logging
+import os
+import random
 import re
-from _ast import Attribute, BoolOp, Call, Compare, Constant, Name
-from datetime import datetime
+import uuid
+from _ast import Attribute, BoolOp, Call, Compare, Name
+from datetime import date, datetime
 from functools import cached_property
 from inspect import getsource, signature
+from time import perf_counter
 from types import SimpleNamespace
 from typing import (
+    TYPE_CHECKING,
     Any,
     Callable,
     ClassVar,
     Dict,
     Generic,
     Iterable,
+    Iterator,
     List,
+    Literal,
     Optional,
     Protocol,
     Set,
+    Tuple,
     Type,
     TypeVar,
     Union,
+    overload,
 )
 
+from .cache import QueryCache
+from .changes import Change, ChangeFeed, Watermark
+from .lazy import arcpy
+from .observe import Event
+from .writer import Writer
+
+if TYPE_CHECKING:
+    from .spatial import SpatialIndex
+
+
+_logger = logging.getLogger("archaic")
+
 
 class DataclassLike(Protocol):
     __dataclass_fields__: ClassVar[Dict[str, Any]]
@@ -64,10 +86,133 @@ class Mapper(Generic[T]):
         """
         self._data_path = data_path
         self._mapping = mapping
+        self._observers: List[Callable[[Event], None]] = []
+        self._relationships: Dict[str, Relationship] = {}
+        self._schema: Optional[Dict[str, Any]] = None
 
     @cached_property
     def info(self):
-        return Info[T](self)
+        if self._schema is not None:
+            return Info[T](self, self._schema)
+        event = self._event("describe")
+        info = Info[T](self)
+        if event:
+            event.add("describe", event.start)
+            self._emit(event)
+        return info
+
+    def observe(self, observer: Callable[[Event], None]) -> Callable[[], None]:
+        """Registers an observer that receives an event after each operation.
+
+        Args:
+            observer: Callback (e.g. `Stats()` or `log_events()`).
+
+        Returns:
+            Callable[[], None]: Function that unregisters the observer.
+        """
+        self._observers.append(observer)
+        return lambda: self._observers.remove(observer)
+
+    def relate(
+        self,
+        property: str,
+        mapper: "Mapper[Any]",
+        key: str,
+        foreign_key: Optional[str] = None,
+        many: bool = False,
+    ) -> None:
+        """Declares a relationship that can be loaded eagerly by `read`.
+
+        Args:
+            property: Property that receives the related item(s).  If the model
+                declares it, it must have a default and is not mapped to a field.
+            mapper: Mapper of the related feature class or table.
+            key: Property of this model holding the key.
+            foreign_key: Property of the related model holding the key.  Defaults
+                to `key`.
+            many: If True, a list of related items is assigned; otherwise the first
+                match or None.  Defaults to False.
+
+        Examples:
+            ```
+            cities.relate("country", countries, key="cntry_name")
+
+            for city in cities.read(include="country"):
+                print(city.city_name, city.country and city.country.pop)
+            ```
+        """
+        self._relationships[property] = Relationship(
+            mapper, key, foreign_key or key, many
+        )
+        self.__dict__.pop("info", None)
+
+    def export_schema(self, path: Optional[str] = None) -> Dict[str, Any]:
+        """Exports the schema read by Describe as a JSON-serializable snapshot.
+
+        The snapshot holds the paths and fields of the layer, not the model,
+        so any mapper of the layer can load it with `load_schema`.
+
+        Args:
+            path: JSON file to write.  Defaults to None.
+
+        Returns:
+            Dict[str, Any]: Schema snapshot.
+
+        Examples:
+            ```
+            Mapper[City]("world.gdb/cities").export_schema("cities.json")
+
+            # In a worker process.
+            mapper = Mapper[City]("world.gdb/cities")
+            mapper.load_schema("cities.json")
+            ```
+        """
+        snapshot = self.info.to_dict()
+        if path:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(temp_path, path)
+        return snapshot
+
+    def load_schema(
+        self, snapshot: Union[str, Dict[str, Any]], validate: bool = True
+    ) -> None:
+        """Loads a snapshot from `export_schema` so Describe is never called.
+
+        The mapper's path must match the path the snapshot was exported from (and,
+        if relative, `arcpy.env.workspace` must match too) or the catalog path.
+
+        Args:
+            snapshot: Snapshot or JSON file.
+            validate: Whether to check the snapshot against the layer's fields with
+                ListFields.  Defaults to True.
+
+        Raises:
+            ValueError: If the snapshot does not match the layer or the model.
+        """
+        event = self._event("load_schema")
+        try:
+            if isinstance(snapshot, str):
+                with open(snapshot) as f:
+                    data: Dict[str, Any] = json.load(f)
+            else:
+                data = snapshot
+            if not self._matches_snapshot(data):
+                raise ValueError(
+                    f"Schema snapshot of {data.get('source_path')} does not match "
+                    f"{self._data_path}."
+                )
+            info = Info[T](self, data)
+            if validate:
+                start = perf_counter()
+                info.validate(self._data_path)
+                if event:
+                    event.add("validate", start)
+            self._schema = data
+            self.__dict__["info"] = info
+        finally:
+            self._emit(event)
 
     def read(
         self,
@@ -75,6 +220,8 @@ class Mapper(Generic[T]):
             str, Callable[[T], bool], Iterable[int], Iterable[str], None
         ] = None,
         wkid: Optional[int] = None,
+        include: Union[str, Iterable[str], None] = None,
+        cache: Optional[QueryCache] = None,
         **kwargs: Any,
     ) -> Iterable[T]:
         """Queries the feature class.
@@ -82,24 +229,155 @@ class Mapper(Generic[T]):
         Args:
             filter: Where clause, lambda, object ids or global ids.  Defaults to None.
             wkid: Well-known id (e.g. 4326).  Defaults to None.
+            include: Relationship(s) declared by `relate` to load in batches of
+                1000 items.  Defaults to None.
+            cache: Cache to load results from, or to save them to once fully
+                read.  Defaults to None.
 
         Returns:
             Iterable[T]: Items.
         """
-        if wkid is not None:
-            kwargs["spatial_reference"] = arcpy.SpatialReference(wkid)
-        data_path = self.info.data_path
-        fields = list(self.info.properties.values())
-        properties = self.info.properties
-        for where_clause in self._get_where_clauses_from_filter(filter):
-            with arcpy.da.SearchCursor(
-                data_path, fields, where_clause, **kwargs
-            ) as cursor:
-                for row in cursor:
-                    d = dict(zip(fields, row))
-                    yield self._create(
-                        **{p: d.get(f) if f else None for p, f in properties.items()}
-                    )
+        event = self._event("read")
+        if cache:
+            items = self._read_cached(filter, wkid, kwargs, cache, event)
+        else:
+            items = self._read(filter, wkid, kwargs, event)
+        if include:
+            items = self._include(items, self._get_relationships(include), wkid, event)
+        return items if event is None else self._observed(items, event)
+
+    def read_changes(
+        self,
+        since: Union[Watermark, datetime, None] = None,
+        wkid: Optional[int] = None,
+        detect_deletes: bool = True,
+    ) -> ChangeFeed[T]:
+        """Queries rows inserted, updated or deleted since a watermark.
+
+        Inserts and updates are found through the editor-tracking date fields.
+        Deletes are found by comparing the row count with the object id snapshot
+        in the watermark, and only when they differ by diffing against the ids.
+
+        Args:
+            since: Watermark from a previous feed or an edit time.  If None, every
+                row is reported as inserted.  Defaults to None.
+            wkid: Well-known id (e.g. 4326).  Defaults to None.
+            detect_deletes: Whether to report deletes and keep an object id
+                snapshot in the new watermark.  Defaults to True.
+
+        Returns:
+            ChangeFeed[T]: Changes.  Its `watermark` is set once fully iterated.
+        """
+        if not self.info.edited_at_field:
+            raise ValueError(
+                f"Editor tracking fields not found in {self.info.data_path}."
+            )
+        if isinstance(since, datetime):
+            since = Watermark(since)
+        return ChangeFeed(self, since, wkid, detect_deletes)
+
+    def sample(
+        self,
+        n: int,
+        filter: Union[str, Callable[[T], bool], None] = None,
+        stratify_by: Optional[str] = None,
+        seed: Optional[int] = None,
+        wkid: Optional[int] = None,
+    ) -> List[T]:
+        """Reads a simple or stratified random sample without a full scan.
+
+        Candidate object ids are drawn from the object id range and fetched in
+        chunks, drawing more to make up for gaps left by deleted rows or rows
+        excluded by the filter.  When most of the range would have to be drawn,
+        the matching object ids are read and sampled instead.
+
+        Args:
+            n: Sample size.
+            filter: Where clause or lambda.  Defaults to None.
+            stratify_by: Property whose values define strata.  The distinct values
+                are read with a DISTINCT cursor and counted with GetCount, and the
+                sample is allocated to strata in proportion to their size.
+                Defaults to None.
+            seed: Random seed.  Defaults to None.
+            wkid: Well-known id (e.g. 4326).  Defaults to None.
+
+        Returns:
+            List[T]: Up to n items.
+        """
+        event = self._event("sample")
+        try:
+            rng = random.Random(seed)
+            where_clause = self._get_where_clauses_from_filter(filter, event)[0]
+            if stratify_by:
+                ids = self._sample_stratified(n, where_clause, stratify_by, rng, event)
+            else:
+                ids = self._sample_ids(n, where_clause, rng, event)
+            items = {self._get_oid(x): x for x in self._read(ids, wkid, {}, event)}
+            return [items[x] for x in ids if x in items]
+        finally:
+            self._emit(event)
+
+    def spatial_index(
+        self,
+        filter: Union[
+            str, Callable[[T], bool], Iterable[int], Iterable[str], None
+        ] = None,
+        wkid: Optional[int] = None,
+        cell_size: Optional[float] = None,
+    ) -> "SpatialIndex[T]":
+        """Loads object ids and `SHAPE@XY` into an in-memory index.
+
+        Requires NumPy, e.g. from the `spatial` extra (`pip install archaic[spatial]`).
+
+        Args:
+            filter: Where clause, lambda, object ids or global ids.  Defaults to None.
+            wkid: Well-known id (e.g. 3857) of the coordinates and distances.
+                Defaults to None.
+            cell_size: Grid cell size.  Defaults to one fitting about four points
+                per cell.
+
+        Returns:
+            SpatialIndex[T]: Index answering nearest, radius and envelope queries.
+        """
+        try:
+            import numpy as np
+        except ImportError as e:
+            raise ImportError(
+                "Mapper.spatial_index requires NumPy; "
+                "install it with 'pip install archaic[spatial]'."
+            ) from e
+
+        from .spatial import SpatialIndex
+
+        event = self._event("spatial_index")
+        try:
+            kwargs: Dict[str, Any] = {}
+            if wkid is not None:
+                kwargs["spatial_reference"] = arcpy.SpatialReference(wkid)
+            ids: List[int] = []
+            xy: List[Any] = []
+            for where_clause in self._get_where_clauses_from_filter(filter, event):
+                if event:
+                    event.where_clauses.append(where_clause)
+                    event.cursors += 1
+                with arcpy.da.SearchCursor(
+                    self.info.data_path, ["OID@", "SHAPE@XY"], where_clause, **kwargs
+                ) as cursor:
+                    for id, point in cursor:
+                        if point is not None:
+                            ids.append(id)
+                            xy.append(point)
+            if event:
+                event.rows_scanned = event.rows_yielded = len(ids)
+            return SpatialIndex(
+                self,
+                np.array(ids, dtype=np.int64),
+                np.array(xy, dtype=np.float64).reshape(-1, 2),
+                wkid,
+                cell_size,
+            )
+        finally:
+            self._emit(event)
 
     def get(self, id: Union[int, str], wkid: Optional[int] = None) -> Optional[T]:
         """Gets an item from the feature class.
@@ -111,10 +389,14 @@ class Mapper(Generic[T]):
         Returns:
             Optional[T]: Item if found.
         """
-        for where_clause in self._get_where_clauses_from_ids(id):
-            for item in self.read(where_clause, wkid):
-                return item
-        return None
+        event = self._event("get")
+        try:
+            for where_clause in self._get_where_clauses_from_ids(id, event):
+                for item in self._read(where_clause, wkid, {}, event):
+                    return item
+            return None
+        finally:
+            self._emit(event)
 
     def insert_many(self, items: Iterable[T], **kwargs: Any) -> List[int]:
         """Inserts multiple items.
@@ -125,14 +407,11 @@ class Mapper(Generic[T]):
         Returns:
             List[int]: List of object ids.
         """
-        data_path = self.info.data_path
-        fields = list(self.info.edit_properties.values())
-        properties = self.info.edit_properties
-        inserted: List[int] = []
-        with arcpy.da.InsertCursor(data_path, fields, **kwargs) as cursor:
-            for item in items:
-                inserted.append(cursor.insertRow(self._get_values(item, properties)))
-        return inserted
+        event = self._event("insert_many")
+        try:
+            return self._insert_many(items, kwargs, event)
+        finally:
+            self._emit(event)
 
     def insert(self, item: T) -> T:
         """Inserts a single item.
@@ -143,11 +422,35 @@ class Mapper(Generic[T]):
         Returns:
             T: Created item.
         """
-        inserted_id = self.insert_many([item])[0]
-        inserted = self.get(inserted_id)
-        if not inserted:
+        event = self._event("insert")
+        try:
+            inserted_id = self._insert_many([item], {}, event)[0]
+            for inserted in self._read([inserted_id], None, {}, event):
+                return inserted
             raise RuntimeError("Failed to insert item.")
-        return inserted
+        finally:
+            self._emit(event)
+
+    def writer(
+        self,
+        batch_size: int = 1000,
+        flush_interval: Optional[float] = 1.0,
+        max_queue: int = 10000,
+        **kwargs: Any,
+    ) -> Writer[T]:
+        """Creates a thread-safe buffered writer for inserts.
+
+        Args:
+            batch_size: Maximum items taken from the queue at a time.
+            flush_interval: Seconds before queued items are written and written
+                rows are committed.  If None, rows are committed only by `flush`
+                and `close`.  Defaults to 1.0.
+            max_queue: Queued items before producers block.  Defaults to 10000.
+
+        Returns:
+            Writer[T]: Writer.  Close it (or use it as a context manager) to commit.
+        """
+        return Writer(self, batch_size, flush_interval, max_queue, kwargs)
 
     def update_where(
         self,
@@ -164,24 +467,11 @@ class Mapper(Generic[T]):
         Returns:
             List[int]: List of object ids.
         """
-        data_path = self.info.data_path
-        fields = list(self.info.edit_properties.values())
-        properties = self.info.edit_properties
-        ids: Set[int] = set()
-        for where_clause in self._get_where_clauses_from_filter(filter):
-            with arcpy.da.UpdateCursor(
-                data_path, fields, where_clause, **kwargs
-            ) as cursor:
-                for row in cursor:
-                    d = dict(zip(fields, row))
-                    before = self._create(
-                        **{p: d.get(f) if f else None for p, f in properties.items()}
-                    )
-                    result = update(before)
-                    after = before if result is None else result
-                    cursor.updateRow(self._get_values(after, properties))
-                    ids.add(self._get_oid(before))
-        return list(ids)
+        event = self._event("update_where")
+        try:
+            return self._update_where(filter, update, kwargs, event)
+        finally:
+            self._emit(event)
 
     def update(self, items: Union[T, List[T]]) -> List[int]:
         """Updates items based on their mutated state.
@@ -198,52 +488,872 @@ class Mapper(Generic[T]):
             items = list(items)
         else:
             items = [items]
-        cache = {self._get_oid(x): x for x in items}
-        ids: Set[int] = set()
-        for where_clause in self._get_where_clauses_from_ids(items):
-            for id in self.update_where(
-                where_clause, lambda x: cache[self._get_oid(x)]
-            ):
-                ids.add(id)
-        return list(ids)
+        event = self._event("update")
+        try:
+            cache = {self._get_oid(x): x for x in items}
+            ids: Set[int] = set()
+            for where_clause in self._get_where_clauses_from_ids(items, event):
+                for id in self._update_where(
+                    where_clause, lambda x: cache[self._get_oid(x)], {}, event
+                ):
+                    ids.add(id)
+            return list(ids)
+        finally:
+            self._emit(event)
+
+    def upsert_many(
+        self, items: Iterable[T], key: str, delete_missing: bool = False
+    ) -> Dict[str, int]:
+        """Updates items matched by a key and inserts the rest.
 
-    def delete_where(self, filter: Union[str, Callable[[T], bool], None]) -> List[int]:
+        Args:
+            items: Items to upsert.  Items without a key value (None, an empty
+                string or, for GlobalID and GUID fields, anything but a `{GUID}`)
+                and items whose key matches no row are inserted.  If several
+                items share a key, the last one wins.
+            key: Property used to match rows (e.g. 'globalid' or a business key).
+            delete_missing: Whether to delete rows whose key is not among the
+                items.  Defaults to False.
+
+        Returns:
+            Dict[str, int]: Number of rows 'inserted', 'updated' and 'deleted'.
+        """
+        event = self._event("upsert_many")
+        try:
+            return self._upsert_many(items, key, delete_missing, event)
+        finally:
+            self._emit(event)
+
+    @overload
+    def delete_where(
+        self,
+        filter: Union[str, Callable[[T], bool], None],
+        return_ids: Literal[True] = True,
+        truncate: bool = False,
+        set_based_threshold: Optional[int] = 10_000,
+    ) -> List[int]: ...
+
+    @overload
+    def delete_where(
+        self,
+        filter: Union[str, Callable[[T], bool], None],
+        return_ids: Literal[False],
+        truncate: bool = False,
+        set_based_threshold: Optional[int] = 10_000,
+    ) -> int: ...
+
+    def delete_where(
+        self,
+        filter: Union[str, Callable[[T], bool], None],
+        return_ids: bool = True,
+        truncate: bool = False,
+        set_based_threshold: Optional[int] = 10_000,
+    ) -> Union[List[int], int]:
         """Deletes items based on a filter.
 
+        Matching rows are counted first, stopping at `set_based_threshold`.
+        Below the threshold, rows are deleted one by one with an UpdateCursor.  At
+        or above it, the object ids are read if returned and the rows of a table
+        view are deleted with DeleteRows, falling back to the cursor where the tool fails
+        (e.g. on versioned data).  Geoprocessing tools do not take part in an
+        `arcpy.da.Editor` session; pass `set_based_threshold=None` inside one.
+
         Args:
             filter: Where clause or lambda.  If None, all items are deleted.
+            return_ids: Whether to return the object ids deleted.  Defaults to True.
+            truncate: Whether to delete all items with TruncateTable if the filter
+                is None.  Truncating does not take part in an edit session, does
+                not archive rows and does not cascade to related rows or
+                attachments.  Defaults to False.
+            set_based_threshold: Number of rows from which DeleteRows is used, or
+                None to always use the cursor.  Defaults to 10000.
 
         Returns:
-            List[int]: List of object ids.
+            Union[List[int], int]: List of object ids, or the number of rows deleted
+                if not `return_ids`.
         """
-        data_path = self.info.data_path
-        ids: Set[int] = set()
-        for where_clause in self._get_where_clauses_from_filter(filter):
-            with arcpy.da.UpdateCursor(
-                data_path, self.info.oid_field, where_clause
-            ) as cursor:
-                for row in cursor:
-                    cursor.deleteRow()
-                    ids.add(row[0])
-        return list(ids)
+        event = self._event("delete_where")
+        try:
+            where_clauses = self._get_where_clauses_from_filter(filter, event)
+            return self._delete_where(
+                where_clauses,
+                return_ids,
+                set_based_threshold,
+                event,
+                set_based=True if truncate and filter is None else None,
+                truncate=truncate,
+            )
+        finally:
+            self._emit(event)
 
+    @overload
     def delete(
-        self, items: Union[T, int, str, Iterable[T], Iterable[int], Iterable[str]]
-    ) -> List[int]:
+        self,
+        items: Union[T, int, str, Iterable[T], Iterable[int], Iterable[str]],
+        return_ids: Literal[True] = True,
+        set_based_threshold: Optional[int] = 10_000,
+    ) -> List[int]: ...
+
+    @overload
+    def delete(
+        self,
+        items: Union[T, int, str, Iterable[T], Iterable[int], Iterable[str]],
+        return_ids: Literal[False],
+        set_based_threshold: Optional[int] = 10_000,
+    ) -> int: ...
+
+    def delete(
+        self,
+        items: Union[T, int, str, Iterable[T], Iterable[int], Iterable[str]],
+        return_ids: bool = True,
+        set_based_threshold: Optional[int] = 10_000,
+    ) -> Union[List[int], int]:
         """Deletes items specified or by object ids or global ids.
 
+        Fewer object ids than `set_based_threshold` are deleted with an
+        UpdateCursor.  More are grouped into ranges of consecutive ids and deleted
+        with DeleteRows (see `delete_where`).
+
         Args:
             items: Items, object ids or global ids.
+            return_ids: Whether to return the object ids deleted.  Defaults to True.
+            set_based_threshold: Number of ids from which DeleteRows is used, or
+                None to always use the cursor.  Defaults to 10000.
 
         Returns:
-            List[int]: List of object ids.
+            Union[List[int], int]: List of object ids, or the number of rows deleted
+                if not `return_ids`.
         """
+        event = self._event("delete")
+        try:
+            ids = list(self._get_ids(items))
+            oids = [x for x in ids if isinstance(x, int)]
+            set_based = (
+                set_based_threshold is not None and len(oids) >= set_based_threshold
+            )
+            if set_based:
+                where_clauses = self._get_where_clauses_from_oid_ranges(oids, event)
+            else:
+                field = self.info.oid_field if oids else "GlobalID"
+                where_clauses = self._get_where_clauses_from_values(field, ids, event)
+            return self._delete_where(
+                where_clauses, return_ids, set_based_threshold, event, set_based
+            )
+        finally:
+            self._emit(event)
+
+    def _read(
+        self,
+        filter: Union[str, Callable[[T], bool], Iterable[int], Iterable[str], None],
+        wkid: Optional[int],
+        kwargs: Dict[str, Any],
+        event: Optional[Event],
+    ) -> Iterable[T]:
+        if wkid is not None:
+            kwargs["spatial_reference"] = arcpy.SpatialReference(wkid)
+        data_path = self.info.data_path
+        fields = list(self.info.properties.values())
+        properties = self.info.properties
+        for where_clause in self._get_where_clauses_from_filter(filter, event):
+            if event:
+                event.where_clauses.append(where_clause)
+                event.cursors += 1
+            start = perf_counter()
+            with arcpy.da.SearchCursor(
+                data_path, fields, where_clause, **kwargs
+            ) as cursor:
+                if event:
+                    start = event.add("cursor_open", start)
+                for row in cursor:
+                    if event:
+                        start = event.add("fetch", start)
+                        event.rows_scanned += 1
+                    d = dict(zip(fields, row))
+                    item = self._create(
+                        **{p: d.get(f) if f else None for p, f in properties.items()}
+                    )
+                    if event:
+                        event.add("hydrate", start)
+                        event.rows_yielded += 1
+                    yield item
+                    if event:
+                        start = perf_counter()
+
+    def _read_cached(
+        self,
+        filter: Union[str, Callable[[T], bool], Iterable[int], Iterable[str], None],
+        wkid: Optional[int],
+        kwargs: Dict[str, Any],
+        cache: QueryCache,
+        event: Optional[Event],
+    ) -> Iterable[T]:
+        data_path = self.info.data_path
+        fields = list(self.info.properties.values())
+        properties = self.info.properties
+        where_clauses = self._get_where_clauses_from_filter(filter, event)
+        start = perf_counter()
+        if cache.token:
+            token: Any = cache.token(data_path)
+        else:
+            token = self._get_change_token(event)
+        if event:
+            start = event.add("change_token", start)
+        key = cache.key(
+            data_path,
+            fields,
+            where_clauses,
+            wkid,
+            token,
+            sorted((k, repr(v)) for k, v in kwargs.items()),
+        )
+        entry = cache.load(key)
+        if event:
+            event.add("cache", start)
+
+        if entry is not None:
+            rows = zip(*[self._decode_column(x) for x in entry[1]])
+            for row in rows:
+                d = dict(zip(fields, row))
+                if event:
+                    event.rows_yielded += 1
+                yield self._create(
+                    **{p: d.get(f) if f else None for p, f in properties.items()}
+                )
+            return
+
+        if wkid is not None:
+            kwargs["spatial_reference"] = arcpy.SpatialReference(wkid)
+        columns: List[List[Any]] = [[] for _ in fields]
+        for where_clause in where_clauses:
+            if event:
+                event.where_clauses.append(where_clause)
+                event.cursors += 1
+            with arcpy.da.SearchCursor(
+                data_path, fields, where_clause, **kwargs
+            ) as cursor:
+                for row in cursor:
+                    for column, value in zip(columns, row):
+                        column.append(value)
+                    d = dict(zip(fields, row))
+                    if event:
+                        event.rows_scanned += 1
+                        event.rows_yielded += 1
+                    yield self._create(
+                        **{p: d.get(f) if f else None for p, f in properties.items()}
+                    )
+        cache.save(
+            key,
+            fields,
+            [self._encode_column(f, x) for f, x in zip(fields, columns)],
+        )
+
+    def _get_change_token(self, event: Optional[Event] = None) -> List[str]:
+        data_path = self.info.data_path
+        token = [arcpy.management.GetCount(data_path)[0]]
+        path = data_path
+        while path and not os.path.exists(path):
+            path = os.path.dirname(path)
+        if os.path.isdir(path):
+            # Edits to a folder workspace (e.g. a file geodatabase) touch its files.
+            token.append(str(max(x.stat().st_mtime for x in os.scandir(path))))
+            return token
+        edited_at_field = self.info.edited_at_field
+        if not edited_at_field:
+            # The row count alone misses updates; a connection file never changes.
+            raise ValueError(
+                f"Cannot detect edits to {data_path} without editor tracking; "
+                "pass QueryCache(token=...)."
+            )
+        if event:
+            event.cursors += 1
+        with arcpy.da.SearchCursor(
+            data_path,
+            [edited_at_field],
+            f"{edited_at_field} IS NOT NULL",
+            sql_clause=(None, f"ORDER BY {edited_at_field} DESC"),
+        ) as cursor:
+            for row in cursor:
+                token.append(str(row[0]))
+                break
+        if os.path.isfile(path):
+            token.append(str(os.path.getmtime(path)))
+        return token
+
+    def _encode_column(self, field: str, values: List[Any]) -> Any:
+        if field != "SHAPE@":
+            return values
+        reference = next((x.spatialReference for x in values if x is not None), None)
+        return {
+            "spatial_reference": reference and reference.exportToString(),
+            "wkb": [None if x is None else bytes(x.WKB) for x in values],
+        }
+
+    def _decode_column(self, column: Any) -> List[Any]:
+        if not isinstance(column, dict):
+            return column
+        reference = arcpy.SpatialReference()
+        if column["spatial_reference"]:
+            reference.loadFromString(column["spatial_reference"])
+        return [
+            None if x is None else arcpy.FromWKB(bytearray(x), reference)
+            for x in column["wkb"]
+        ]
+
+    def _include(
+        self,
+        items: Iterable[T],
+        relationships: Dict[str, "Relationship"],
+        wkid: Optional[int],
+        event: Optional[Event],
+    ) -> Iterable[T]:
+        batch: List[T] = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == 1000:
+                self._attach(batch, relationships, wkid, event)
+                yield from batch
+                batch = []
+        if batch:
+            self._attach(batch, relationships, wkid, event)
+            yield from batch
+
+    def _attach(
+        self,
+        items: List[T],
+        relationships: Dict[str, "Relationship"],
+        wkid: Optional[int],
+        event: Optional[Event],
+    ) -> None:
+        for property, relationship in relationships.items():
+            mapper = relationship.mapper
+            keys = {getattr(x, relationship.key) for x in items} - {None}
+            related: Dict[Any, List[Any]] = {}
+            if keys:
+                field = mapper.info.properties[relationship.foreign_key]
+                for where_clause in mapper._get_where_clauses_from_values(
+                    field, list(keys), event
+                ):
+                    for x in mapper._read(where_clause, wkid, {}, event):
+                        related.setdefault(
+                            getattr(x, relationship.foreign_key), []
+                        ).append(x)
+            for item in items:
+                matches = related.get(getattr(item, relationship.key), [])
+                self._assign(
+                    item,
+                    property,
+                    matches if relationship.many else next(iter(matches), None),
+                )
+
+    def _get_relationships(
+        self, include: Union[str, Iterable[str]]
+    ) -> Dict[str, "Relationship"]:
+        relationships: Dict[str, Relationship] = {}
+        for property in [include] if isinstance(include, str) else include:
+            if property not in self._relationships:
+                raise ValueError(f"Relationship '{property}' not found.")
+            relationships[property] = self._relationships[property]
+        return relationships
+
+    def _read_changes(self, feed: ChangeFeed[T]) -> Iterator[Change[T]]:
+        event = self._event("read_changes")
+        try:
+            data_path = self.info.data_path
+            properties = self.info.properties
+            fields = list(properties.values())
+            extra_fields = ["OID@", self.info.edited_at_field]
+            if self.info.created_at_field:
+                extra_fields.append(self.info.created_at_field)
+            n = len(fields)
+            previous = feed.since
+            since = previous.time if previous else None
+            edited_at_field = self.info.edited_at_field
+            if since:
+                where_clause = (
+                    f"{edited_at_field} > timestamp '{since:%Y-%m-%d %H:%M:%S}'"
+                )
+            elif previous:
+                where_clause = f"{edited_at_field} IS NOT NULL"
+            else:
+                where_clause = ""
+            kwargs: Dict[str, Any] = {}
+            if feed._wkid is not None:
+                kwargs["spatial_reference"] = arcpy.SpatialReference(feed._wkid)
+            if event:
+                event.where_clauses.append(where_clause)
+                event.cursors += 1
+
+            latest = since
+            oids: List[int] = []
+            inserted: List[int] = []
+            with arcpy.da.SearchCursor(
+                data_path, fields + extra_fields, where_clause, **kwargs
+            ) as cursor:
+                for row in cursor:
+                    if event:
+                        event.rows_scanned += 1
+                    oid, edited = row[n], row[n + 1]
+                    created = row[n + 2] if len(row) > n + 2 else None
+                    oids.append(oid)
+                    # The where clause is truncated to seconds.
+                    if since and edited is not None and edited <= since:
+                        continue
+                    if edited is not None and (latest is None or edited > latest):
+                        latest = edited
+                    d = dict(zip(fields, row))
+                    item = self._create(
+                        **{p: d.get(f) if f else None for p, f in properties.items()}
+                    )
+                    if (
+                        not previous
+                        or (since and created is not None and created > since)
+                        or (previous.ranges is not None and oid not in previous)
+                    ):
+                        inserted.append(oid)
+                        kind = "insert"
+                    else:
+                        kind = "update"
+                    if event:
+                        event.rows_yielded += 1
+                    yield Change(kind, oid, item)
+
+            if not feed._detect_deletes:
+                feed.watermark = Watermark(latest)
+            elif not previous:
+                feed.watermark = Watermark.from_ids(latest, oids)
+            elif previous.ranges is not None:
+                added = [x for x in inserted if x not in previous]
+                count = int(arcpy.management.GetCount(data_path)[0])
+                if count == previous.count + len(added):
+                    feed.watermark = Watermark.from_ids(latest, added, previous.ranges)
+                else:
+                    current = self._read_oids(event)
+                    for oid in sorted(previous.ids() - current):
+                        yield Change("delete", oid)
+                    feed.watermark = Watermark.from_ids(latest, current)
+            else:
+                feed.watermark = Watermark.from_ids(latest, self._read_oids(event))
+        finally:
+            self._emit(event)
+
+    def _sample_ids(
+        self,
+        n: int,
+        where_clause: str,
+        rng: random.Random,
+        event: Optional[Event],
+        oid_range: Optional[Tuple[int, int]] = None,
+        count: Optional[int] = None,
+    ) -> List[int]:
+        data_path = self.info.data_path
+        oid_field = self.info.oid_field
+        oid_range = oid_range or self._get_oid_range(event)
+        if oid_range is None:
+            return []
+        low, high = oid_range
+        size = high - low + 1
+        if count is None:
+            count = int(arcpy.management.GetCount(data_path)[0])
+        ratio = count / size
+
+        selected: List[int] = []
+        tried: Set[int] = set()
+        while len(selected) < n and len(tried) < size:
+            needed = n - len(selected)
+            untried = size - len(tried)
+            m = min(untried, int(needed / max(ratio, 1e-6) * 1.2) + 10)
+            if m > untried / 2:
+                population = [
+                    x for x in self._read_oids(event, where_clause) if x not in tried
+                ]
+                population.sort()
+                selected.extend(rng.sample(population, min(needed, len(population))))
+                break
+            candidates: List[int] = []
+            while len(candidates) < m:
+                candidate = rng.randint(low, high)
+                if candidate not in tried:
+                    tried.add(candidate)
+                    candidates.append(candidate)
+            hits: Set[int] = set()
+            for clause in self._get_where_clauses_from_values(
+                oid_field, candidates, event
+            ):
+                if where_clause:
+                    clause = f"({where_clause}) AND {clause}"
+                if event:
+                    event.where_clauses.append(clause)
+                    event.cursors += 1
+                with arcpy.da.SearchCursor(data_path, ["OID@"], clause) as cursor:
+                    hits.update(row[0] for row in cursor)
+            selected.extend([x for x in candidates if x in hits][:needed])
+            ratio = max(len(hits), 0.5) / len(candidates)
+        return selected
+
+    def _sample_stratified(
+        self,
+        n: int,
+        where_clause: str,
+        stratify_by: str,
+        rng: random.Random,
+        event: Optional[Event],
+    ) -> List[int]:
+        if stratify_by not in self.info.properties:
+            raise ValueError(f"Property '{stratify_by}' is not mapped.")
+        data_path = self.info.data_path
+        field = self.info.properties[stratify_by]
+        if event:
+            event.where_clauses.append(where_clause)
+            event.cursors += 1
+        with arcpy.da.SearchCursor(
+            data_path, [field], where_clause, sql_clause=("DISTINCT", None)
+        ) as cursor:
+            values = sorted({row[0] for row in cursor}, key=lambda v: (v is None, v))
+
+        clauses: Dict[Any, str] = {}
+        counts: Dict[Any, int] = {}
+        for value in values:
+            if value is None:
+                clause = f"{field} IS NULL"
+            else:
+                clause = f"{field} = {_get_sql_value(value)}"
+            if where_clause:
+                clause = f"({where_clause}) AND {clause}"
+            clauses[value] = clause
+            counts[value] = self._get_count(clause)
+        total = sum(counts.values())
+        oid_range = self._get_oid_range(event)
+        if not total or oid_range is None:
+            return []
+
+        n = min(n, total)
+        quotas = {k: n * v / total for k, v in counts.items()}
+        allocation = {k: int(q) for k, q in quotas.items()}
+        remainders = sorted(quotas, key=lambda k: allocation[k] - quotas[k])
+        for k in remainders[: n - sum(allocation.values())]:
+            allocation[k] += 1
+        ids: List[int] = []
+        for k, clause in clauses.items():
+            if allocation[k]:
+                ids.extend(
+                    self._sample_ids(
+                        allocation[k], clause, rng, event, oid_range, counts[k]
+                    )
+                )
+        rng.shuffle(ids)
+        return ids
+
+    def _get_oid_range(self, event: Optional[Event]) -> Optional[Tuple[int, int]]:
+        oid_field = self.info.oid_field
+        bounds: List[int] = []
+        for order in ["ASC", "DESC"]:
+            if event:
+                event.cursors += 1
+            with arcpy.da.SearchCursor(
+                self.info.data_path,
+                ["OID@"],
+                sql_clause=(None, f"ORDER BY {oid_field} {order}"),
+            ) as cursor:
+                for row in cursor:
+                    bounds.append(row[0])
+                    break
+        return (bounds[0], bounds[1]) if len(bounds) == 2 else None
+
+    def _get_count(self, where_clause: str) -> int:
+        view = f"archaic_{uuid.uuid4().hex}"
+        arcpy.management.MakeTableView(self.info.data_path, view, where_clause)
+        try:
+            return int(arcpy.management.GetCount(view)[0])
+        finally:
+            arcpy.management.Delete(view)
+
+    def _read_oids(self, event: Optional[Event], where_clause: str = "") -> Set[int]:
+        if event:
+            event.cursors += 1
+        with arcpy.da.SearchCursor(
+            self.info.data_path, ["OID@"], where_clause
+        ) as cursor:
+            return {row[0] for row in cursor}
+
+    def _upsert_many(
+        self,
+        items: Iterable[T],
+        key: str,
+        delete_missing: bool,
+        event: Optional[Event],
+    ) -> Dict[str, int]:
+        if key not in self.info.properties:
+            raise ValueError(f"Property '{key}' is not mapped.")
+        data_path = self.info.data_path
+        key_field = self.info.properties[key]
+        is_guid = any(
+            name == key_field and type in ("GlobalID", "GUID")
+            for name, type, _ in self.info.snapshot["fields"]
+        )
+        keyed: List[Tuple[Any, T]] = []
+        new_items: List[T] = []
+        for item in items:
+            value = getattr(item, key)
+            if value is None or value == "":
+                new_items.append(item)
+            elif is_guid and not re.match(_GUID_PATTERN, str(value)):
+                new_items.append(item)
+            else:
+                keyed.append((value, item))
+        by_key = dict(keyed)
+
+        matches: Dict[int, T] = {}
+        matched_keys: Set[Any] = set()
+        for where_clause in self._get_where_clauses_from_values(
+            key_field, list(by_key), event
+        ):
+            if event:
+                event.where_clauses.append(where_clause)
+                event.cursors += 1
+            with arcpy.da.SearchCursor(
+                data_path, ["OID@", key_field], where_clause
+            ) as cursor:
+                for oid, value in cursor:
+                    if event:
+                        event.rows_scanned += 1
+                    if value in by_key:
+                        matches[oid] = by_key[value]
+                        matched_keys.add(value)
+
+        fields = list(self.info.edit_properties.values())
+        properties = self.info.edit_properties
+        oid_index = (
+            fields.index(self.info.oid_field) if self.info.oid_field in fields else None
+        )
+        for where_clause in self._get_where_clauses_from_values(
+            self.info.oid_field, list(matches), event
+        ):
+            if event:
+                event.where_clauses.append(where_clause)
+                event.cursors += 1
+            with arcpy.da.UpdateCursor(
+                data_path, [*fields, "OID@"], where_clause
+            ) as cursor:
+                for row in cursor:
+                    oid = row[-1]
+                    values = self._get_values(matches[oid], properties)
+                    if oid_index is not None:
+                        values[oid_index] = oid
+                    cursor.updateRow([*values, oid])
+
+        deleted = 0
+        if delete_missing:
+            if event:
+                event.cursors += 1
+            with arcpy.da.UpdateCursor(data_path, ["OID@", key_field]) as cursor:
+                for _, value in cursor:
+                    if event:
+                        event.rows_scanned += 1
+                    if value not in by_key:
+                        cursor.deleteRow()
+                        deleted += 1
+
+        new_items.extend(x for value, x in by_key.items() if value not in matched_keys)
+        inserted = self._insert_many(new_items, {}, event) if new_items else []
+        return {"inserted": len(inserted), "updated": len(matches), "deleted": deleted}
+
+    def _insert_many(
+        self, items: Iterable[T], kwargs: Dict[str, Any], event: Optional[Event]
+    ) -> List[int]:
+        data_path = self.info.data_path
+        fields = list(self.info.edit_properties.values())
+        properties = self.info.edit_properties
+        inserted: List[int] = []
+        if event:
+            event.cursors += 1
+        start = perf_counter()
+        with arcpy.da.InsertCursor(data_path, fields, **kwargs) as cursor:
+            if event:
+                event.add("cursor_open", start)
+            for item in items:
+                if event:
+                    start = perf_counter()
+                inserted.append(cursor.insertRow(self._get_values(item, properties)))
+                if event:
+                    event.add("write", start)
+        return inserted
+
+    def _update_where(
+        self,
+        filter: Union[str, Callable[[T], bool], Iterable[int], Iterable[str], None],
+        update: Callable[[T], Union[None, T]],
+        kwargs: Dict[str, Any],
+        event: Optional[Event],
+    ) -> List[int]:
+        data_path = self.info.data_path
+        fields = list(self.info.edit_properties.values())
+        properties = self.info.edit_properties
         ids: Set[int] = set()
-        for where_clause in self._get_where_clauses_from_ids(items):
-            for id in self.delete_where(where_clause):
-                ids.add(id)
+        for where_clause in self._get_where_clauses_from_filter(filter, event):
+            if event:
+                event.where_clauses.append(where_clause)
+                event.cursors += 1
+            start = perf_counter()
+            with arcpy.da.UpdateCursor(
+                data_path, fields, where_clause, **kwargs
+            ) as cursor:
+                if event:
+                    start = event.add("cursor_open", start)
+                for row in cursor:
+                    if event:
+                        start = event.add("fetch", start)
+                        event.rows_scanned += 1
+                    d = dict(zip(fields, row))
+                    before = self._create(
+                        **{p: d.get(f) if f else None for p, f in properties.items()}
+                    )
+                    if event:
+                        start = event.add("hydrate", start)
+                    result = update(before)
+                    after = before if result is None else result
+                    if event:
+                        start = event.add("callback", start)
+                    cursor.updateRow(self._get_values(after, properties))
+                    ids.add(self._get_oid(before))
+                    if event:
+                        start = event.add("write", start)
         return list(ids)
 
+    def _delete_where(
+        self,
+        where_clauses: List[str],
+        return_ids: bool,
+        set_based_threshold: Optional[int],
+        event: Optional[Event],
+        set_based: Optional[bool] = None,
+        truncate: bool = False,
+    ) -> Union[List[int], int]:
+        ids: Set[int] = set()
+        count = 0
+        for where_clause in where_clauses:
+            if event:
+                event.where_clauses.append(where_clause)
+            use_set_based = bool(set_based)
+            if set_based is None and set_based_threshold is not None:
+                rows = self._count_rows(where_clause, set_based_threshold, event)
+                use_set_based = rows >= set_based_threshold
+            if use_set_based and return_ids:
+                ids.update(self._read_oids(event, where_clause))
+            deleted: Optional[int] = None
+            if use_set_based:
+                deleted = self._delete_set_based(where_clause, truncate, event)
+            if deleted is None:
+                deleted = self._delete_rows(where_clause, ids, event)
+            count += deleted
+        return list(ids) if return_ids else count
+
+    def _count_rows(
+        self,
+        where_clause: str,
+        limit: int,
+        event: Optional[Event],
+    ) -> int:
+        rows = 0
+        if event:
+            event.cursors += 1
+        with arcpy.da.SearchCursor(
+            self.info.data_path, ["OID@"], where_clause
+        ) as cursor:
+            for _ in cursor:
+                rows += 1
+                if rows >= limit:
+                    break
+        return rows
+
+    def _delete_set_based(
+        self, where_clause: str, truncate: bool, event: Optional[Event]
+    ) -> Optional[int]:
+        data_path = self.info.data_path
+        start = perf_counter()
+        if truncate and not where_clause:
+            try:
+                count = int(arcpy.management.GetCount(data_path)[0])
+                arcpy.management.TruncateTable(data_path)
+                if event:
+                    event.add("truncate", start)
+                return count
+            except arcpy.ExecuteError:
+                pass
+        view = f"archaic_{uuid.uuid4().hex}"
+        try:
+            arcpy.management.MakeTableView(data_path, view, where_clause)
+            try:
+                count = int(arcpy.management.GetCount(view)[0])
+                arcpy.management.DeleteRows(view)
+            finally:
+                arcpy.management.Delete(view)
+        except arcpy.ExecuteError:
+            return None
+        if event:
+            event.add("delete_rows", start)
+        return count
+
+    def _delete_rows(
+        self, where_clause: str, ids: Set[int], event: Optional[Event]
+    ) -> int:
+        count = 0
+        if event:
+            event.cursors += 1
+        start = perf_counter()
+        with arcpy.da.UpdateCursor(
+            self.info.data_path, self.info.oid_field, where_clause
+        ) as cursor:
+            if event:
+                start = event.add("cursor_open", start)
+            for row in cursor:
+                if event:
+                    start = event.add("fetch", start)
+                    event.rows_scanned += 1
+                cursor.deleteRow()
+                ids.add(row[0])
+                count += 1
+                if event:
+                    start = event.add("write", start)
+        return count
+
+    def _matches_snapshot(self, snapshot: Dict[str, Any]) -> bool:
+        def normalize(path: Optional[str]) -> str:
+            if not path:
+                return ""
+            return os.path.normpath(path.replace("\\", "/")).replace("\\", "/").lower()
+
+        data_path = normalize(self._data_path)
+        if data_path == normalize(snapshot.get("data_path")):
+            return True
+        if data_path != normalize(snapshot.get("source_path")):
+            return False
+        # A relative path only names the same layer under the same workspace.
+        return os.path.isabs(self._data_path) or normalize(
+            arcpy.env.workspace
+        ) == normalize(snapshot.get("workspace"))
+
+    def _event(self, operation: str) -> Optional[Event]:
+        if not self._observers:
+            return None
+        return Event(operation, self._data_path)
+
+    def _emit(self, event: Optional[Event]) -> None:
+        if event is None:
+            return
+        event.duration = perf_counter() - event.start
+        for observer in list(self._observers):
+            try:
+                observer(event)
+            except Exception:
+                # An observer must not mask the operation's error or its result.
+                _logger.exception("Observer %r failed on %r.", observer, event)
+
+    def _observed(self, items: Iterable[T], event: Event) -> Iterable[T]:
+        try:
+            yield from items
+        finally:
+            self._emit(event)
+
     def _create(self, **kwargs: Any) -> T:
         dataclass_params = getattr(self.info.model, "__dataclass_params__", None)
         is_dataclass = dataclass_params is not None
@@ -273,6 +1383,13 @@ class Mapper(Generic[T]):
 
         return item
 
+    def _assign(self, item: T, property_name: str, value: Any) -> None:
+        dataclass_params = getattr(self.info.model, "__dataclass_params__", None)
+        if getattr(dataclass_params, "frozen", False):
+            object.__setattr__(item, property_name, value)
+        else:
+            setattr(item, property_name, value)
+
     def _get_values(self, item: T, properties: Iterable[str]) -> List[Any]:
         values: List[Any] = []
         for property in properties:
@@ -286,37 +1403,69 @@ class Mapper(Generic[T]):
         return values
 
     def _get_where_clauses_from_ids(
-        self, obj: Union[T, int, str, Iterable[T], Iterable[int], Iterable[str]]
+        self,
+        obj: Union[T, int, str, Iterable[T], Iterable[int], Iterable[str]],
+        event: Optional[Event] = None,
     ) -> List[str]:
-        where_clauses: List[str] = []
         ids = list(self._get_ids(obj))
+        if not ids:
+            return []
+        field = self.info.oid_field if isinstance(ids[0], int) else "GlobalID"
+        return self._get_where_clauses_from_values(field, ids, event)
+
+    def _get_where_clauses_from_values(
+        self, field: str, values: List[Any], event: Optional[Event] = None
+    ) -> List[str]:
+        where_clauses: List[str] = []
         n = 1000
-        for chunk in [ids[i : i + n] for i in range(0, len(ids), n)]:
-            first = chunk[0]
-            if isinstance(first, int):
-                where_clauses.append(
-                    f"{self.info.oid_field} IN ({','.join(map(str, chunk))})"
-                )
-            elif isinstance(first, str):
-                where_clauses.append(
-                    f"GlobalID IN ({','.join(map(self._quote, chunk))})"
-                )
+        for chunk in [values[i : i + n] for i in range(0, len(values), n)]:
+            literals = (self._quote(x) if isinstance(x, str) else str(x) for x in chunk)
+            where_clauses.append(f"{field} IN ({','.join(literals)})")
+        if event:
+            event.id_chunks += len(where_clauses)
         return where_clauses
 
+    def _get_where_clauses_from_oid_ranges(
+        self, ids: List[int], event: Optional[Event] = None
+    ) -> List[str]:
+        oid_field = self.info.oid_field
+        values: List[int] = []
+        between: List[str] = []
+        for start, end in Watermark.from_ids(None, ids).ranges or []:
+            if end - start < 2:
+                values.extend(range(start, end + 1))
+            else:
+                between.append(f"{oid_field} BETWEEN {start} AND {end}")
+        n = 1000
+        where_clauses = [
+            " OR ".join(between[i : i + n]) for i in range(0, len(between), n)
+        ]
+        if event:
+            event.id_chunks += len(where_clauses)
+        return where_clauses + self._get_where_clauses_from_values(
+            oid_field, values, event
+        )
+
     def _get_where_clauses_from_filter(
         self,
         filter: Union[str, Callable[[T], bool], Iterable[int], Iterable[str], None],
+        event: Optional[Event] = None,
     ) -> List[str]:
         if filter is None:
             return [""]
         if isinstance(filter, str):
             return [filter]
         if callable(filter):
-            return [to_sql(filter, self.info.properties)]
-        return self._get_where_clauses_from_ids(filter)
+            start = perf_counter()
+            where_clause = to_sql(filter, self.info.properties)
+            if event:
+                event.add("to_sql", start)
+            return [where_clause]
+        return self._get_where_clauses_from_ids(filter, event)
 
     def _quote(self, value: Any) -> str:
-        return f"'{value}'"
+        escaped = str(value).replace("'", "''")
+        return f"'{escaped}'"
 
     def _get_ids(self, obj) -> Iterable[Union[int, str]]:
         if isinstance(obj, (int, str)):
@@ -334,8 +1483,25 @@ class Mapper(Generic[T]):
         return getattr(item, self.info.oid_property)
 
 
+_GUID_PATTERN = r"^\{[0-9A-Fa-f]{8}(-[0-9A-Fa-f]{4}){3}-[0-9A-Fa-f]{12}\}$"
+
+
+class Relationship:
+    def __init__(
+        self, mapper: "Mapper[Any]", key: str, foreign_key: str, many: bool
+    ) -> None:
+        self.mapper = mapper
+        self.key = key
+        self.foreign_key = foreign_key
+        self.many = many
+
+
 class Info(Generic[T]):
-    def __init__(self, mapper: "Mapper[T]") -> None:
+    version: ClassVar[int] = 2
+
+    def __init__(
+        self, mapper: "Mapper[T]", snapshot: Optional[Dict[str, Any]] = None
+    ) -> None:
         if __orig_class__ := getattr(mapper, "__orig_class__", None):
             model = __orig_class__.__args__[0]
         else:
@@ -351,22 +1517,39 @@ class Info(Generic[T]):
         else:
             self.keys = [k for k in signature(model.__init__).parameters if k != "self"]
 
-        description = arcpy.Describe(mapper._data_path)
-        self.data_path: str = description.catalogPath
+        if snapshot is None:
+            snapshot = Info.describe(mapper._data_path)
+        elif snapshot.get("version") != Info.version:
+            raise ValueError(
+                f"Unsupported schema snapshot version: {snapshot.get('version')}."
+            )
+        self.snapshot = snapshot
+        self.data_path: str = snapshot["data_path"]
         self.oid_field: str
         self.oid_property: str
+        self.created_at_field: Optional[str] = None
+        self.edited_at_field: Optional[str] = None
         self.properties: Dict[str, str] = {}
         self.edit_properties: Dict[str, str] = {}
 
         upper_fields: Dict[str, str] = {}
         upper_read_only_fields: Set[str] = set()
-        for field in description.fields:
-            if re.match(r"^(?!\d)[\w$]+$", field.name):
-                upper_fields[field.name.upper()] = field.name
-                if field.type == "OID":
-                    self.oid_field = field.name
-                elif not field.editable:
-                    upper_read_only_fields.add(field.name.upper())
+        for name, type, editable in snapshot["fields"]:
+            if re.match(r"^(?!\d)[\w$]+$", name):
+                upper_fields[name.upper()] = name
+                if type == "OID":
+                    self.oid_field = name
+                elif not editable:
+                    upper_read_only_fields.add(name.upper())
+
+        created_at_field = snapshot.get("created_at_field")
+        edited_at_field = snapshot.get("edited_at_field")
+        self.created_at_field = upper_fields.get(
+            (created_at_field or "CREATED_DATE").upper()
+        )
+        self.edited_at_field = upper_fields.get(
+            (edited_at_field or "LAST_EDITED_DATE").upper()
+        )
 
         def resolve_fields():
             if model == SimpleNamespace:
@@ -382,6 +1565,8 @@ class Info(Generic[T]):
                 for model_type in reversed(model.mro()):
                     if __annotations__ := getattr(model_type, "__annotations__", None):
                         for property in __annotations__:
+                            if property in mapper._relationships:
+                                continue
                             field = mapper._mapping.get(property) or property
                             upper_field = field.upper()
                             if upper_field == "SHAPE":
@@ -403,6 +1588,44 @@ class Info(Generic[T]):
             if field.upper() not in upper_read_only_fields:
                 self.edit_properties[property] = field
 
+    @staticmethod
+    def describe(data_path: str) -> Dict[str, Any]:
+        description = arcpy.Describe(data_path)
+        return {
+            "version": Info.version,
+            "data_path": description.catalogPath,
+            "source_path": data_path,
+            "workspace": arcpy.env.workspace,
+            "fields": [[f.name, f.type, f.editable] for f in description.fields],
+            "created_at_field": getattr(description, "createdAtFieldName", None),
+            "edited_at_field": getattr(description, "editedAtFieldName", None),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.snapshot)
+
+    def validate(self, data_path: str) -> None:
+        fields = [[f.name, f.type, f.editable] for f in arcpy.ListFields(data_path)]
+        if sorted(fields) != sorted(self.snapshot["fields"]):
+            raise ValueError(f"Schema snapshot of {data_path} is out of date.")
+
+
+def _get_sql_value(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, str):
+        escaped = value.replace("'", "''")
+        return f"'{escaped}'"
+    if isinstance(value, datetime):
+        return f"timestamp '{value:%Y-%m-%d %H:%M:%S}'"
+    if isinstance(value, date):
+        return f"date '{value:%Y-%m-%d}'"
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise ValueError(f"Unsupported value: {value!r}")
+
 
 def to_sql(predicate: Callable[[T], bool], properties: Dict[str, str]) -> str:
     class LambdaFinder(ast.NodeVisitor):
@@ -438,78 +1661,142 @@ def to_sql(predicate: Callable[[T], bool], properties: Dict[str, str]) -> str:
             return visitor.expression, visitor.freevars
 
     class LambdaVisitor(ast.NodeVisitor):
-        def __init__(self, expression: ast.expr, freevars: Dict[str, Any]) -> None:
+        def __init__(self, expression: ast.Lambda, freevars: Dict[str, Any]) -> None:
             super().__init__()
-            self._expressions: List[Union[LambdaVisitor, str]] = []
             self._freevars = freevars
-            self.visit(expression)
-
-        def visit_Attribute(self, node: Attribute) -> Any:
-            attr = node.attr
-            value: Any = node.value
-            if value.id in self._freevars:
-                self._expressions.append(
-                    self._get_sql_value(getattr(self._freevars[value.id], attr))
-                )
-            else:
-                self._expressions.append(properties[attr])
-
-        def visit_BoolOp(self, node: BoolOp) -> Any:
-            self._expressions.append("(")
-            expressions: List[Union[LambdaVisitor, str]] = []
-            for value in node.values:
-                expressions.append(LambdaVisitor(value, self._freevars))
-                expressions.append(self._convert_op(node.op))
-            expressions.pop()
-            self._expressions.extend(expressions)
-            self._expressions.append(")")
-
-        def visit_Call(self, node: Call) -> Any:
-            if not (func := getattr(node.func, "attr"), None):
-                self.generic_visit(node)
-                return
-            if func == "startswith":
-                field_name = properties[node.func.value.attr]  # type: ignore
-                self._expressions.append(
-                    f"{field_name} LIKE '{self._get_value(node.args[0])}%'"
-                )
-            elif func == "endswith":
-                field_name = properties[node.func.value.attr]  # type: ignore
-                self._expressions.append(
-                    f"{field_name} LIKE '%{self._get_value(node.args[0])}'"
-                )
-
-        def visit_Compare(self, node: Compare) -> Any:
-            op = node.ops[0]
-            if isinstance(op, ast.In):
-                field_name = properties[node.comparators[0].attr]  # type: ignore
-                self._expressions.append(
-                    f"{field_name} LIKE '%{self._get_value(node.left)}%'"
-                )
+            self._args = {x.arg for x in expression.args.args}
+            self._sql: str = self.visit(expression.body)
+
+        def visit(self, node: ast.AST) -> str:
+            if not self._has_field(node):
+                return _get_sql_value(self._evaluate(node))
+            return super().visit(node)
+
+        def generic_visit(self, node: ast.AST) -> str:
+            raise ValueError(f"Unsupported expression: {ast.unparse(node)}")
+
+        def visit_Attribute(self, node: Attribute) -> str:
+            value = node.value
+            if isinstance(value, Name) and value.id in self._args:
+                if node.attr not in properties:
+                    raise ValueError(f"Property '{node.attr}' is not mapped.")
+                return properties[node.attr]
+            if node.attr in ("year", "month", "day", "hour", "minute", "second"):
+                return f"EXTRACT({node.attr.upper()} FROM {self.visit(value)})"
+            return self.generic_visit(node)
+
+        def visit_BoolOp(self, node: BoolOp) -> str:
+            op = self._convert_op(node.op)
+            return f"({f' {op} '.join(self.visit(x) for x in node.values)})"
+
+        def visit_UnaryOp(self, node: ast.UnaryOp) -> str:
+            if isinstance(node.op, ast.Not):
+                return f"NOT ({self.visit(node.operand)})"
+            if isinstance(node.op, ast.USub):
+                return f"-{self.visit(node.operand)}"
+            return self.generic_visit(node)
+
+        def visit_BinOp(self, node: ast.BinOp) -> str:
+            left, right = self.visit(node.left), self.visit(node.right)
+            if isinstance(node.op, ast.Mod):
+                return f"MOD({left}, {right})"
+            return f"({left} {self._convert_op(node.op)} {right})"
+
+        def visit_Call(self, node: Call) -> str:
+            func = node.func
+            if not isinstance(func, Attribute) or not self._has_field(func.value):
+                return self.generic_visit(node)
+            field_name = self.visit(func.value)
+            if func.attr in ("upper", "lower") and not node.args:
+                return f"{func.attr.upper()}({field_name})"
+            if func.attr in ("startswith", "endswith") and len(node.args) == 1:
+                value = self._evaluate(node.args[0])
+                if func.attr == "startswith":
+                    return self._like(field_name, value, "", "%")
+                return self._like(field_name, value, "%", "")
+            return self.generic_visit(node)
+
+        def visit_Compare(self, node: Compare) -> str:
+            operands = [node.left, *node.comparators]
+            if len(node.ops) == 2 and self._has_field(operands[1]):
+                lower, upper = operands[0], operands[2]
+                if isinstance(node.ops[0], ast.GtE) and isinstance(
+                    node.ops[1], ast.GtE
+                ):
+                    lower, upper = upper, lower
+                elif not (
+                    isinstance(node.ops[0], ast.LtE)
+                    and isinstance(node.ops[1], ast.LtE)
+                ):
+                    lower = upper = None
+                if lower and upper:
+                    return (
+                        f"{self.visit(operands[1])}"
+                        f" BETWEEN {self.visit(lower)} AND {self.visit(upper)}"
+                    )
+            expressions = [
+                self._compare(left, op, right)
+                for left, op, right in zip(operands, node.ops, operands[1:])
+            ]
+            if len(expressions) == 1:
+                return expressions[0]
+            return f"({' AND '.join(expressions)})"
+
+        def _compare(self, left: ast.expr, op: ast.cmpop, right: ast.expr) -> str:
+            if isinstance(op, (ast.In, ast.NotIn)):
+                negate = "NOT " if isinstance(op, ast.NotIn) else ""
+                if self._has_field(right):
+                    value = self._evaluate(left)
+                    return self._like(self.visit(right), value, "%", "%", negate)
+                values = self._evaluate(right)
+                if isinstance(values, str):
+                    raise ValueError(f"Unsupported substring test: {values!r}")
+                return self._in(self.visit(left), values, negate)
+            if isinstance(op, (ast.Is, ast.IsNot, ast.Eq, ast.NotEq)):
+                for field, other in ((left, right), (right, left)):
+                    if not self._has_field(other) and self._evaluate(other) is None:
+                        negate = isinstance(op, (ast.IsNot, ast.NotEq))
+                        return f"{self.visit(field)} IS {'NOT ' if negate else ''}NULL"
+            return f"{self.visit(left)} {self._convert_op(op)} {self.visit(right)}"
+
+        def _in(self, field_name: str, values: Iterable[Any], negate: str) -> str:
+            values = list(values)
+            literals = [_get_sql_value(x) for x in values if x is not None]
+            has_null = len(literals) < len(values)
+            if not literals:
+                sql = "1 = 0" if not negate else "1 = 1"
             else:
-                self._expressions.append(LambdaVisitor(node.left, self._freevars))
-                self._expressions.append(self._convert_op(node.ops[0]))
-                self._expressions.append(
-                    LambdaVisitor(node.comparators[0], self._freevars)
-                )
-
-        def visit_Constant(self, node: Constant) -> Any:
-            self._expressions.append(self._get_sql_value(node.value))
-
-        def visit_Name(self, node: Name) -> Any:
-            self._expressions.append(self._get_sql_value(self._freevars[node.id]))
-
-        def _get_sql_value(self, value: Any) -> str:
-            if value is None:
-                return "NULL"
-            if isinstance(value, str):
-                return f"'{value}'"
-            if isinstance(value, datetime):
-                return f"timestamp '{value:%Y-%m-%d %H:%M:%S}'"
-            return str(value)
+                sql = f"{field_name} {negate}IN ({', '.join(literals)})"
+            if not has_null:
+                return sql
+            if negate:
+                return f"({sql} AND {field_name} IS NOT NULL)"
+            return f"({sql} OR {field_name} IS NULL)"
+
+        def _like(
+            self,
+            field_name: str,
+            value: Any,
+            prefix: str,
+            suffix: str,
+            negate: str = "",
+        ) -> str:
+            if not isinstance(value, str):
+                raise TypeError(f"Expected a string, got {value!r}.")
+            escaped = re.sub(r"([\\%_])", r"\\\1", value)
+            pattern = _get_sql_value(f"{prefix}{escaped}{suffix}")
+            escape = " ESCAPE '\\'" if escaped != value else ""
+            return f"{field_name} {negate}LIKE {pattern}{escape}"
+
+        def _has_field(self, node: ast.AST) -> bool:
+            return any(
+                isinstance(x, Name) and x.id in self._args for x in ast.walk(node)
+            )
 
-        def _get_value(self, node: Any) -> Any:
-            return self._freevars[node.id] if isinstance(node, Name) else node.value
+        def _evaluate(self, node: ast.AST) -> Any:
+            expression = ast.Expression(node)  # type: ignore
+            code = compile(ast.fix_missing_locations(expression), "<lambda>", "eval")
+            return eval(code, dict(self._freevars))
 
         def _convert_op(self, op: Any) -> str:
             if isinstance(op, ast.And):
@@ -517,9 +1804,9 @@ def to_sql(predicate: Callable[[T], bool], properties: Dict[str, str]) -> str:
             if isinstance(op, ast.Or):
                 return "OR"
             if isinstance(op, ast.Is):
-                return "IS"
+                return "="
             if isinstance(op, ast.IsNot):
-                return "IS NOT"
+                return "<>"
             if isinstance(op, ast.Eq):
                 return "="
             if isinstance(op, ast.NotEq):
@@ -532,15 +1819,20 @@ def to_sql(predicate: Callable[[T], bool], properties: Dict[str, str]) -> str:
                 return "<"
             if isinstance(op, ast.LtE):
                 return "<="
-            return type(op).__name__
+            if isinstance(op, ast.Add):
+                return "+"
+            if isinstance(op, ast.Sub):
+                return "-"
+            if isinstance(op, ast.Mult):
+                return "*"
+            if isinstance(op, ast.Div):
+                return "/"
+            raise ValueError(f"Unsupported operator: {type(op).__name__}")
 
         def to_sql(self) -> str:
-            text = ""
-            for e in self._expressions:
-                text += e.to_sql() if isinstance(e, LambdaVisitor) else f" {e}"
-            return text
+            return self._sql
 
     expression, freevars = LambdaFinder.find(predicate)
-    where_clause = LambdaVisitor(expression, freevars).to_sql().strip()
+    where_clause = LambdaVisitor(expression, freevars).to_sql()
 
     return where_clause
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import pickle
+import zlib
+from threading import Lock
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+
+class QueryCache:
+    """On-disk cache of `Mapper.read` results.
+
+    Entries are keyed by the catalog path, field list, where clauses, wkid and a
+    change token of the layer, so an edit to the layer makes earlier entries
+    unreachable.  Each entry is a zlib-compressed file holding one list per
+    field.  When the directory grows beyond `max_bytes`, the least recently used
+    entries are removed.
+
+    Entries are pickled; only point the cache at a directory you trust.
+
+    Examples:
+        ```
+        cache = QueryCache("cache", max_bytes=256 * 2**20)
+
+        for country in mapper.read("pop > 1000000", cache=cache):
+            ...
+        ```
+    """
+
+    suffix = ".archaic"
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 * 2**20,
+        token: Optional[Callable[[str], str]] = None,
+    ) -> None:
+        """Initializes the cache.
+
+        Args:
+            directory: Directory for the entries.  Created if missing.
+            max_bytes: Total size of the entries before eviction.
+            token: Function returning a change token for a catalog path.  Defaults
+                to the row count and the modification time of a folder workspace
+                (e.g. a file geodatabase).  Other workspaces use the latest edit
+                date instead, which opens a cursor sorted on the editor-tracking
+                field on every read and is a full sort unless that field is
+                indexed.  Without editor tracking there, nothing reliably
+                reveals an update (an .sde connection file never changes), so
+                reads raise ValueError unless a token is given.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.token = token
+        self._lock = Lock()
+
+    def key(self, *parts: Any) -> str:
+        text = json.dumps(parts, default=repr, sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def load(self, key: str) -> Optional[Tuple[List[str], List[Any]]]:
+        """Loads an entry.
+
+        Args:
+            key: Entry key.
+
+        Returns:
+            Optional[Tuple[List[str], List[Any]]]: Fields and columns if cached.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        entry = pickle.loads(zlib.decompress(data))
+        return entry["fields"], entry["columns"]
+
+    def save(self, key: str, fields: Sequence[str], columns: Sequence[Any]) -> None:
+        """Saves an entry and evicts old entries if over the size limit.
+
+        Args:
+            key: Entry key.
+            fields: Field names.
+            columns: One picklable column of values per field.
+        """
+        entry = {"fields": list(fields), "columns": list(columns)}
+        data = zlib.compress(pickle.dumps(entry, pickle.HIGHEST_PROTOCOL))
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(self.suffix):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(self.suffix):
+                    try:
+                        stat = os.stat(os.path.join(self.directory, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+                total -= size
@@ -0,0 +1,169 @@
+import json
+import os
+from bisect import bisect_right
+from datetime import datetime
+from threading import Lock
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from .archaic import Mapper
+
+T = TypeVar("T")
+
+
+class Change(Generic[T]):
+    """A row inserted, updated or deleted since the watermark.
+
+    `kind` is 'insert', 'update' or 'delete'.  Deleted rows have no item.
+    """
+
+    def __init__(self, kind: str, id: int, item: Optional[T] = None) -> None:
+        self.kind = kind
+        self.id = id
+        self.item = item
+
+    def __repr__(self) -> str:
+        return f"Change({self.kind}, {self.id})"
+
+
+class Watermark:
+    """Last edit time seen and a compact snapshot of object ids.
+
+    Object ids are stored as inclusive ranges, so a layer with few gaps costs a
+    handful of integers regardless of its size.
+    """
+
+    def __init__(
+        self,
+        time: Optional[datetime] = None,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+    ) -> None:
+        self.time = time
+        self.ranges = ranges
+
+    @staticmethod
+    def from_ids(
+        time: Optional[datetime],
+        ids: Iterable[int],
+        ranges: Iterable[Tuple[int, int]] = (),
+    ) -> "Watermark":
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted([*ranges, *((id, id) for id in ids)]):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+            else:
+                merged.append((start, end))
+        return Watermark(time, merged)
+
+    @property
+    def count(self) -> int:
+        return sum(end - start + 1 for start, end in self.ranges or [])
+
+    def __contains__(self, id: int) -> bool:
+        ranges = self.ranges or []
+        i = bisect_right(ranges, (id, float("inf"))) - 1
+        return i >= 0 and ranges[i][0] <= id <= ranges[i][1]
+
+    def ids(self) -> Set[int]:
+        return {id for start, end in self.ranges or [] for id in range(start, end + 1)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "time": self.time.isoformat() if self.time else None,
+            "ranges": self.ranges,
+        }
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> "Watermark":
+        time = d.get("time")
+        ranges = d.get("ranges")
+        return Watermark(
+            datetime.fromisoformat(time) if time else None,
+            [(start, end) for start, end in ranges] if ranges is not None else None,
+        )
+
+
+class WatermarkStore:
+    """Watermarks persisted by name in a JSON file.
+
+    Examples:
+        ```
+        store = WatermarkStore("sync.json")
+
+        feed = mapper.read_changes(since=store.load("cities"))
+        for change in feed:
+            print(change.kind, change.id)
+
+        store.save("cities", feed.watermark)
+        ```
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = Lock()
+
+    def load(self, name: str) -> Optional[Watermark]:
+        """Loads a watermark.
+
+        Args:
+            name: Watermark name.
+
+        Returns:
+            Optional[Watermark]: Watermark if saved.
+        """
+        with self._lock:
+            d = self._read().get(name)
+        return Watermark.from_dict(d) if d else None
+
+    def save(self, name: str, watermark: Watermark) -> None:
+        """Saves a watermark, replacing the file atomically.
+
+        Args:
+            name: Watermark name.
+            watermark: Watermark.
+        """
+        with self._lock:
+            watermarks = self._read()
+            watermarks[name] = watermark.to_dict()
+            temp_path = f"{self._path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(watermarks, f, separators=(",", ":"))
+            os.replace(temp_path, self._path)
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self._path):
+            return {}
+        with open(self._path) as f:
+            return json.load(f)
+
+
+class ChangeFeed(Generic[T]):
+    """Changes since a watermark.  `watermark` is set once iteration completes."""
+
+    def __init__(
+        self,
+        mapper: "Mapper[Any]",
+        since: Optional[Watermark],
+        wkid: Optional[int],
+        detect_deletes: bool,
+    ) -> None:
+        self.since = since
+        self.watermark: Optional[Watermark] = None
+        self._mapper = mapper
+        self._wkid = wkid
+        self._detect_deletes = detect_deletes
+
+    def __iter__(self) -> Iterator[Change[T]]:
+        return self._mapper._read_changes(self)
@@ -0,0 +1,26 @@
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule:
+    """Module imported on first attribute access.
+
+    Importing arcpy takes seconds, so it is deferred until a cursor, Describe or
+    geometry is first needed.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: Optional[ModuleType] = None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, name)
+
+    def __repr__(self) -> str:
+        return f"LazyModule({self._name!r})"
+
+
+arcpy: Any = LazyModule("arcpy")
@@ -0,0 +1,132 @@
+import logging
+from threading import Lock
+from time import perf_counter
+from typing import Any, Dict, List, Optional
+
+
+class Event:
+    """Measurements of a single mapper operation.
+
+    Phases are cumulative seconds spent in ``describe``, ``to_sql``,
+    ``cursor_open``, ``fetch`` (waiting on the cursor), ``hydrate`` (building
+    items), ``callback`` (user update procedures) and ``write`` (insert, update
+    and delete calls on the cursor).
+    """
+
+    def __init__(self, operation: str, data_path: str) -> None:
+        self.operation = operation
+        self.data_path = data_path
+        self.start = perf_counter()
+        self.duration = 0.0
+        self.phases: Dict[str, float] = {}
+        self.cursors = 0
+        self.rows_scanned = 0
+        self.rows_yielded = 0
+        self.where_clauses: List[str] = []
+        self.id_chunks = 0
+
+    def add(self, phase: str, start: float) -> float:
+        """Adds the time elapsed since `start` to a phase.
+
+        Args:
+            phase: Phase name.
+            start: Value of `perf_counter()` when the phase started.
+
+        Returns:
+            float: Current `perf_counter()` value, for timing the next phase.
+        """
+        now = perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - start
+        return now
+
+    def __repr__(self) -> str:
+        phases = ", ".join(f"{k}={v * 1000:.2f}ms" for k, v in self.phases.items())
+        return (
+            f"Event({self.operation} {self.data_path} {self.duration * 1000:.2f}ms"
+            f" cursors={self.cursors} scanned={self.rows_scanned}"
+            f" yielded={self.rows_yielded} id_chunks={self.id_chunks}"
+            f" phases=[{phases}])"
+        )
+
+
+class Stats:
+    """Observer that aggregates events by operation.
+
+    Examples:
+        ```
+        stats = Stats()
+        mapper.observe(stats)
+
+        for city in mapper.read(lambda c: c.pop > 1_000_000):
+            ...
+
+        print(stats.summary()["read"])
+        ```
+    """
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        self._operations: Dict[str, Dict[str, Any]] = {}
+
+    def __call__(self, event: Event) -> None:
+        with self._lock:
+            stats = self._operations.setdefault(
+                event.operation,
+                {
+                    "calls": 0,
+                    "duration": 0.0,
+                    "cursors": 0,
+                    "rows_scanned": 0,
+                    "rows_yielded": 0,
+                    "where_clauses": 0,
+                    "id_chunks": 0,
+                    "phases": {},
+                },
+            )
+            stats["calls"] += 1
+            stats["duration"] += event.duration
+            stats["cursors"] += event.cursors
+            stats["rows_scanned"] += event.rows_scanned
+            stats["rows_yielded"] += event.rows_yielded
+            stats["where_clauses"] += len(event.where_clauses)
+            stats["id_chunks"] += event.id_chunks
+            phases = stats["phases"]
+            for phase, seconds in event.phases.items():
+                phases[phase] = phases.get(phase, 0.0) + seconds
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Returns totals per operation.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Calls, seconds, cursors, rows, where clauses,
+            id chunks and seconds per phase, keyed by operation.
+        """
+        with self._lock:
+            return {
+                k: {**v, "phases": dict(v["phases"])}
+                for k, v in self._operations.items()
+            }
+
+    def reset(self) -> None:
+        """Clears all totals."""
+        with self._lock:
+            self._operations.clear()
+
+
+def log_events(logger: Optional[logging.Logger] = None, level: int = logging.DEBUG):
+    """Creates an observer that writes each event to a logger.
+
+    Args:
+        logger: Logger.  Defaults to the 'archaic' logger.
+        level: Logging level.  Defaults to DEBUG.
+
+    Returns:
+        Callable[[Event], None]: Observer.
+    """
+    logger = logger or logging.getLogger("archaic")
+
+    def observer(event: Event) -> None:
+        if logger.isEnabledFor(level):
+            logger.log(level, "%r where=%r", event, event.where_clauses)
+
+    return observer
@@ -0,0 +1,178 @@
+import numpy as np
+from typing import TYPE_CHECKING, Any, Generic, List, Optional, Tuple, TypeVar, Union
+
+if TYPE_CHECKING:
+    from .archaic import Mapper
+
+T = TypeVar("T")
+
+
+class SpatialIndex(Generic[T]):
+    """In-memory grid index over object ids and `SHAPE@XY` coordinates.
+
+    Points are bucketed into square cells and sorted by cell, so a query only
+    measures distances to the points in the cells it overlaps.  Distances are
+    planar, in the units of the coordinate system the index was loaded in; pass a
+    projected `wkid` to `Mapper.spatial_index` for metric distances.  For lines
+    and polygons, `SHAPE@XY` is the centroid.
+
+    Examples:
+        ```
+        index = mapper.spatial_index(wkid=3857)
+
+        ids = index.within_radius((-8836000, 5411000), 50_000)
+        nearest = index.nearest((-8836000, 5411000), k=3, hydrate=True)
+        ```
+    """
+
+    def __init__(
+        self,
+        mapper: "Mapper[Any]",
+        ids: np.ndarray,
+        xy: np.ndarray,
+        wkid: Optional[int] = None,
+        cell_size: Optional[float] = None,
+    ) -> None:
+        self.ids = ids
+        self.xy = xy
+        self._mapper = mapper
+        self._wkid = wkid
+
+        n = len(ids)
+        self._origin = xy.min(axis=0) if n else np.zeros(2)
+        extent = float((xy.max(axis=0) - self._origin).max()) if n else 0.0
+        if cell_size is not None:
+            size = float(cell_size)
+        elif extent:
+            # Around four points per cell if they were spread evenly.
+            size = extent / max(float(np.sqrt(n / 4)), 1.0)
+        else:
+            size = 1.0
+        self.cell_size = size
+
+        cells = np.floor((xy - self._origin) / size).astype(np.int64)
+        self._shape = cells.max(axis=0) + 1 if n else np.ones(2, dtype=np.int64)
+        keys = cells[:, 0] * self._shape[1] + cells[:, 1]
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def nearest(
+        self, xy: Tuple[float, float], k: int = 1, hydrate: bool = False
+    ) -> Union[List[int], List[T]]:
+        """Finds the nearest points.
+
+        Args:
+            xy: Query point.
+            k: Number of points.  Defaults to 1.
+            hydrate: Whether to return items instead of object ids.  Defaults to False.
+
+        Returns:
+            Union[List[int], List[T]]: Object ids or items, nearest first.
+        """
+        k = min(k, len(self.ids))
+        if k <= 0:
+            return []
+        x, y = xy
+        if not np.isfinite([x, y]).all():
+            raise ValueError(f"Invalid point: {xy}")
+        radius = self.cell_size
+        while True:
+            candidates = self._candidates(
+                x - radius, y - radius, x + radius, y + radius
+            )
+            covers_all = len(candidates) == len(self.ids)
+            if len(candidates) >= k:
+                d2 = self._distances2(candidates, x, y)
+                nearest = np.argpartition(d2, k - 1)[:k]
+                if covers_all or d2[nearest].max() <= radius * radius:
+                    nearest = nearest[np.argsort(d2[nearest], kind="stable")]
+                    return self._result(candidates[nearest], hydrate)
+            radius *= 2
+
+    def within_radius(
+        self, xy: Tuple[float, float], radius: float, hydrate: bool = False
+    ) -> Union[List[int], List[T]]:
+        """Finds the points within a distance.
+
+        Args:
+            xy: Query point.
+            radius: Distance.
+            hydrate: Whether to return items instead of object ids.  Defaults to False.
+
+        Returns:
+            Union[List[int], List[T]]: Object ids or items, nearest first.
+        """
+        x, y = xy
+        candidates = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        d2 = self._distances2(candidates, x, y)
+        mask = d2 <= radius * radius
+        candidates, d2 = candidates[mask], d2[mask]
+        return self._result(candidates[np.argsort(d2, kind="stable")], hydrate)
+
+    def within_bbox(
+        self,
+        xmin: float,
+        ymin: float,
+        xmax: float,
+        ymax: float,
+        hydrate: bool = False,
+    ) -> Union[List[int], List[T]]:
+        """Finds the points within an envelope.
+
+        Args:
+            xmin: Minimum x.
+            ymin: Minimum y.
+            xmax: Maximum x.
+            ymax: Maximum y.
+            hydrate: Whether to return items instead of object ids.  Defaults to False.
+
+        Returns:
+            Union[List[int], List[T]]: Object ids or items.
+        """
+        candidates = self._candidates(xmin, ymin, xmax, ymax)
+        xy = self.xy[candidates]
+        mask = (
+            (xy[:, 0] >= xmin)
+            & (xy[:, 0] <= xmax)
+            & (xy[:, 1] >= ymin)
+            & (xy[:, 1] <= ymax)
+        )
+        return self._result(candidates[mask], hydrate)
+
+    def _candidates(
+        self, xmin: float, ymin: float, xmax: float, ymax: float
+    ) -> np.ndarray:
+        if not len(self.ids):
+            return np.empty(0, dtype=np.int64)
+        low = np.floor((np.array([xmin, ymin]) - self._origin) / self.cell_size)
+        high = np.floor((np.array([xmax, ymax]) - self._origin) / self.cell_size)
+        low = np.maximum(low, 0).astype(np.int64)
+        high = np.minimum(high, self._shape - 1).astype(np.int64)
+        if (low > high).any():
+            return np.empty(0, dtype=np.int64)
+        # Cells of a column are contiguous in key order, so each column is a slice.
+        columns = np.arange(low[0], high[0] + 1) * self._shape[1]
+        starts = np.searchsorted(self._keys, columns + low[1], side="left")
+        ends = np.searchsorted(self._keys, columns + high[1], side="right")
+        return np.concatenate(
+            [self._order[s:e] for s, e in zip(starts, ends)]
+            or [np.empty(0, dtype=np.int64)]
+        )
+
+    def _distances2(self, candidates: np.ndarray, x: float, y: float) -> np.ndarray:
+        d = self.xy[candidates] - (x, y)
+        return np.einsum("ij,ij->i", d, d)
+
+    def _result(
+        self, candidates: np.ndarray, hydrate: bool
+    ) -> Union[List[int], List[T]]:
+        ids: List[int] = self.ids[candidates].tolist()
+        if not hydrate:
+            return ids
+        items = {
+            self._mapper._get_oid(x): x for x in self._mapper.read(ids, self._wkid)
+        }
+        return [items[x] for x in ids if x in items]
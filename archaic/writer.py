@@ -0,0 +1,203 @@
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Event as ThreadingEvent
+from threading import Lock, Thread
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from .lazy import arcpy
+
+if TYPE_CHECKING:
+    from .archaic import Mapper
+
+T = TypeVar("T")
+
+
+class _Flush:
+    def __init__(self, close: bool = False) -> None:
+        self.close = close
+        self.done = ThreadingEvent()
+        self.error: Optional[BaseException] = None
+
+
+class Writer(Generic[T]):
+    """Buffered inserts from any thread through one InsertCursor.
+
+    Items are queued and written by a single owning thread, which keeps one
+    InsertCursor open.  Rows are committed (the cursor is closed) on `flush`, on
+    `close` and once the oldest uncommitted row is `flush_interval` seconds old.
+    A full queue blocks producers.  Futures resolve once their rows are
+    committed; a failed commit fails them and is raised by the next `flush` or
+    `close`.
+
+    Examples:
+        ```
+        with mapper.writer(batch_size=500, flush_interval=1.0) as writer:
+            futures = [writer.submit(city) for city in cities]
+
+        ids = [f.result() for f in futures]
+        ```
+    """
+
+    def __init__(
+        self,
+        mapper: "Mapper[Any]",
+        batch_size: int,
+        flush_interval: Optional[float],
+        max_queue: int,
+        kwargs: Dict[str, Any],
+    ) -> None:
+        self._mapper = mapper
+        self._properties = mapper.info.edit_properties
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._kwargs = kwargs
+        self._queue: "Queue[Any]" = Queue(max_queue)
+        self._lock = Lock()
+        self._closed = False
+        self._thread = Thread(target=self._run, name="archaic-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: T, timeout: Optional[float] = None) -> "Future[int]":
+        """Queues an item for insertion.
+
+        Args:
+            item: Item to insert.
+            timeout: Seconds to wait for space in the queue.  Defaults to None
+                (wait indefinitely).
+
+        Returns:
+            Future[int]: Object id once the row is committed.
+        """
+        future: "Future[int]" = Future()
+        # Enqueue under the lock so nothing lands behind the close sentinel.
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Writer is closed.")
+            self._queue.put((item, future), timeout=timeout)
+        return future
+
+    def submit_many(self, items: Iterable[T]) -> List["Future[int]"]:
+        """Queues multiple items for insertion.
+
+        Args:
+            items: Items to insert.
+
+        Returns:
+            List[Future[int]]: Object ids once the rows are committed.
+        """
+        return [self.submit(x) for x in items]
+
+    def flush(self) -> None:
+        """Waits until all queued items are written and committed."""
+        flush = _Flush()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Writer is closed.")
+            self._queue.put(flush)
+        flush.done.wait()
+        if flush.error:
+            raise flush.error
+
+    def close(self) -> None:
+        """Writes and commits all queued items and stops the owning thread."""
+        flush = _Flush(close=True)
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(flush)
+        flush.done.wait()
+        self._thread.join()
+        if flush.error:
+            raise flush.error
+
+    def __enter__(self) -> "Writer[T]":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        mapper = self._mapper
+        properties = self._properties
+        fields = list(properties.values())
+        cursor: Any = None
+        opened = 0.0
+        pending: List[Tuple["Future[int]", int]] = []
+        error: Optional[BaseException] = None
+
+        def commit() -> None:
+            nonlocal cursor, error
+            if cursor is None:
+                return
+            event = mapper._event("writer")
+            try:
+                cursor.__exit__(None, None, None)
+            except BaseException as e:
+                error = e
+                for future, _ in pending:
+                    future.set_exception(e)
+            else:
+                for future, id in pending:
+                    future.set_result(id)
+            cursor = None
+            if event:
+                event.start = opened
+                event.cursors = 1
+                event.rows_yielded = len(pending)
+                event.add("write", opened)
+                mapper._emit(event)
+            pending.clear()
+
+        while True:
+            timeout = None
+            if cursor is not None and self._flush_interval is not None:
+                timeout = max(0.0, opened + self._flush_interval - perf_counter())
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except Empty:
+                commit()
+                continue
+
+            batch = [entry]
+            deadline = perf_counter() + (self._flush_interval or 0.0)
+            while len(batch) < self._batch_size and not isinstance(batch[-1], _Flush):
+                try:
+                    batch.append(
+                        self._queue.get(timeout=max(0.0, deadline - perf_counter()))
+                    )
+                except Empty:
+                    break
+
+            for entry in batch:
+                if isinstance(entry, _Flush):
+                    commit()
+                    entry.error, error = error, None
+                    entry.done.set()
+                    if entry.close:
+                        return
+                    continue
+                item, future = entry
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if cursor is None:
+                        cursor = arcpy.da.InsertCursor(
+                            mapper.info.data_path, fields, **self._kwargs
+                        ).__enter__()
+                        opened = perf_counter()
+                    id = cursor.insertRow(mapper._get_values(item, properties))
+                    pending.append((future, id))
+                except BaseException as e:
+                    future.set_exception(e)
@@ -0,0 +1,695 @@
+"""Benchmarks for the Mapper hot paths.
+
+Runs ``read``, ``get``, ``insert_many``, ``update``, ``update_where``, ``delete``,
+``delete_where`` and ``to_sql`` over the same model variants as ``test_.py``, against a scaled-up
+copy of the Cities layer in ``data/world.geodatabase``.
+
+When ArcGIS is not installed, a small sqlite-backed arcpy stand-in is used
+instead.  It implements just enough of ``arcpy`` (Describe, GetCount, the ``da``
+cursors and point geometries) for the mapper to run, so the numbers measure
+archaic's own per-row overhead rather than the geodatabase.
+
+Examples:
+    ```
+    python bench_.py --scale 10 --output bench.json
+    python bench_.py --scale 10 --baseline bench.json --threshold 1.25 --threshold read=1.5
+    ```
+"""
+
+import argparse
+import dataclasses
+import json
+import platform
+import re
+import shutil
+import sqlite3
+import statistics
+import struct
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from types import ModuleType, SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+GEODATABASE = "data/world.geodatabase"
+BENCH_GEODATABASE = "data/bench.geodatabase"
+PREFIX = "BENCH:"
+
+
+class _StandIn:
+    """Sqlite-backed replacement for the parts of arcpy used by archaic.
+
+    Attribute columns are copied from the Cities table in the geodatabase.  Esri
+    geometry blobs are not decoded; points are laid out on a deterministic grid.
+    """
+
+    fields = [
+        ("OBJECTID", "OID", False),
+        ("CITY_NAME", "String", True),
+        ("ADMIN_NAME", "String", True),
+        ("CNTRY_NAME", "String", True),
+        ("STATUS", "String", True),
+        ("POP", "Integer", True),
+        ("Shape", "Geometry", True),
+        ("GlobalID", "GlobalID", False),
+        ("created_user", "String", False),
+        ("created_date", "Date", False),
+        ("last_edited_user", "String", False),
+        ("last_edited_date", "Date", False),
+    ]
+    date_fields = {"CREATED_DATE", "LAST_EDITED_DATE"}
+
+    def __init__(self, geodatabase: str, scale: int) -> None:
+        self.connection = sqlite3.connect(":memory:", check_same_thread=False)
+        self.views: Dict[str, Tuple[str, str]] = {}
+        self.connection.execute(
+            "CREATE TABLE Cities (OBJECTID INTEGER PRIMARY KEY, CITY_NAME TEXT, "
+            "ADMIN_NAME TEXT, CNTRY_NAME TEXT, STATUS TEXT, POP INTEGER, "
+            "SHAPE_X REAL, SHAPE_Y REAL, GlobalID TEXT, created_user TEXT, "
+            "created_date TEXT, last_edited_user TEXT, last_edited_date TEXT)"
+        )
+        source = sqlite3.connect(geodatabase)
+        rows = source.execute(
+            "SELECT CITY_NAME, ADMIN_NAME, CNTRY_NAME, STATUS, POP FROM Cities "
+            "ORDER BY OBJECTID"
+        ).fetchall()
+        source.close()
+        records = []
+        for copy in range(scale):
+            for i, row in enumerate(rows):
+                n = copy * len(rows) + i
+                x, y = -180 + (n * 0.137) % 360, -60 + (n * 0.071) % 140
+                records.append((*row, x, y, self._new_globalid()))
+        self.connection.executemany(
+            "INSERT INTO Cities (CITY_NAME, ADMIN_NAME, CNTRY_NAME, STATUS, POP, "
+            "SHAPE_X, SHAPE_Y, GlobalID) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            records,
+        )
+        self.connection.commit()
+
+    def module(self) -> ModuleType:
+        stand_in = self
+
+        class SpatialReference:
+            def __init__(self, wkid: int = 4326) -> None:
+                self.factoryCode = wkid
+
+            def exportToString(self) -> str:
+                return str(self.factoryCode)
+
+            def loadFromString(self, text: str) -> None:
+                self.factoryCode = int(text)
+
+        class Point:
+            def __init__(self, X: float = 0.0, Y: float = 0.0) -> None:
+                self.X = X
+                self.Y = Y
+
+        class PointGeometry:
+            def __init__(
+                self, point: Point, spatial_reference: Optional[SpatialReference] = None
+            ) -> None:
+                self.firstPoint = point
+                self.spatialReference = spatial_reference or SpatialReference(4326)
+
+            @property
+            def WKT(self) -> str:
+                return f"POINT ({self.firstPoint.X} {self.firstPoint.Y})"
+
+            @property
+            def WKB(self) -> bytearray:
+                return bytearray(
+                    struct.pack("<BIdd", 1, 1, self.firstPoint.X, self.firstPoint.Y)
+                )
+
+            def projectAs(self, spatial_reference: SpatialReference) -> "PointGeometry":
+                return PointGeometry(self.firstPoint, spatial_reference)
+
+        class Cursor:
+            def __init__(
+                self,
+                data_path: str,
+                fields: Any,
+                where_clause: Optional[str] = None,
+                spatial_reference: Optional[SpatialReference] = None,
+                sql_clause: Tuple[Optional[str], Optional[str]] = (None, None),
+                **kwargs: Any,
+            ) -> None:
+                self._prefix = sql_clause[0] or ""
+                self._order_by = sql_clause[1] or (
+                    "" if self._prefix else "ORDER BY OBJECTID"
+                )
+                self._table = stand_in._table(data_path)
+                self._fields = [fields] if isinstance(fields, str) else list(fields)
+                self._where_clause = stand_in._where(where_clause)
+                self._spatial_reference = spatial_reference or SpatialReference(4326)
+                self._columns = [c for f in self._fields for c in stand_in._columns(f)]
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args: Any) -> None:
+                stand_in.connection.commit()
+
+            def _select(self) -> List[Tuple[Any, ...]]:
+                oid = "NULL" if self._prefix else "OBJECTID"
+                sql = (
+                    f"SELECT {self._prefix} {oid}, {', '.join(self._columns)} "
+                    f"FROM {self._table}"
+                )
+                if self._where_clause:
+                    sql += f" WHERE {self._where_clause}"
+                return stand_in.connection.execute(f"{sql} {self._order_by}").fetchall()
+
+            def _decode(self, values: Iterable[Any]) -> List[Any]:
+                row: List[Any] = []
+                it = iter(values)
+                for field in self._fields:
+                    upper = field.upper()
+                    if upper in ("SHAPE@", "SHAPE@XY"):
+                        x, y = next(it), next(it)
+                        if x is None:
+                            row.append(None)
+                        elif upper == "SHAPE@":
+                            row.append(
+                                PointGeometry(Point(x, y), self._spatial_reference)
+                            )
+                        else:
+                            row.append((x, y))
+                    elif upper in stand_in.date_fields:
+                        value = next(it)
+                        row.append(value and datetime.fromisoformat(value))
+                    else:
+                        row.append(next(it))
+                return row
+
+            def _encode(self, values: Iterable[Any]) -> Dict[str, Any]:
+                encoded: Dict[str, Any] = {}
+                for field, value in zip(self._fields, values):
+                    upper = field.upper()
+                    if upper in ("SHAPE@", "SHAPE@XY"):
+                        if isinstance(value, PointGeometry):
+                            value = (value.firstPoint.X, value.firstPoint.Y)
+                        x, y = value if value is not None else (None, None)
+                        encoded["SHAPE_X"], encoded["SHAPE_Y"] = x, y
+                    elif upper not in ("OBJECTID", "OID@"):
+                        encoded[field] = value
+                return encoded
+
+        class SearchCursor(Cursor):
+            def __iter__(self):
+                for row in self._select():
+                    yield tuple(self._decode(row[1:]))
+
+        class UpdateCursor(Cursor):
+            def __iter__(self):
+                for row in self._select():
+                    self._oid = row[0]
+                    yield self._decode(row[1:])
+
+            def updateRow(self, values: List[Any]) -> None:
+                encoded = self._encode(values)
+                encoded["last_edited_user"] = "bench"
+                encoded["last_edited_date"] = stand_in._now()
+                assignments = ", ".join(f"{k} = ?" for k in encoded)
+                stand_in.connection.execute(
+                    f"UPDATE {self._table} SET {assignments} WHERE OBJECTID = ?",
+                    [*encoded.values(), self._oid],
+                )
+
+            def deleteRow(self) -> None:
+                stand_in.connection.execute(
+                    f"DELETE FROM {self._table} WHERE OBJECTID = ?", [self._oid]
+                )
+
+        class InsertCursor(Cursor):
+            def insertRow(self, values: List[Any]) -> int:
+                encoded = self._encode(values)
+                now = stand_in._now()
+                encoded["GlobalID"] = stand_in._new_globalid()
+                encoded["created_user"] = encoded["last_edited_user"] = "bench"
+                encoded["created_date"] = encoded["last_edited_date"] = now
+                cursor = stand_in.connection.execute(
+                    f"INSERT INTO {self._table} ({', '.join(encoded)}) "
+                    f"VALUES ({', '.join('?' for _ in encoded)})",
+                    list(encoded.values()),
+                )
+                return cursor.lastrowid  # type: ignore
+
+        def Describe(data_path: str) -> SimpleNamespace:
+            table = stand_in._table(data_path)
+            return SimpleNamespace(
+                catalogPath=f"{arcpy.env.workspace}/{table}",
+                fields=[
+                    SimpleNamespace(name=n, type=t, editable=e)
+                    for n, t, e in stand_in.fields
+                ],
+            )
+
+        def ListFields(data_path: str) -> List[SimpleNamespace]:
+            return Describe(data_path).fields
+
+        class ExecuteError(Exception):
+            pass
+
+        def MakeTableView(
+            in_table: str, out_view: str, where_clause: Optional[str] = None
+        ) -> None:
+            stand_in.views[out_view] = (
+                stand_in._table(in_table),
+                stand_in._where(where_clause),
+            )
+
+        def GetCount(data_path: str) -> List[str]:
+            (count,) = stand_in._execute("SELECT COUNT(*)", data_path).fetchone()
+            return [str(count)]
+
+        def DeleteRows(in_rows: str) -> None:
+            stand_in._execute("DELETE", in_rows)
+            stand_in.connection.commit()
+
+        def TruncateTable(in_table: str) -> None:
+            stand_in.connection.execute(f"DELETE FROM {stand_in._table(in_table)}")
+            stand_in.connection.commit()
+
+        def Delete(in_data: str) -> None:
+            stand_in.views.pop(in_data, None)
+
+        def FromWKB(
+            wkb: bytearray, spatial_reference: SpatialReference
+        ) -> PointGeometry:
+            _, _, x, y = struct.unpack("<BIdd", bytes(wkb))
+            return PointGeometry(Point(x, y), spatial_reference)
+
+        arcpy = ModuleType("arcpy")
+        arcpy.__dict__.update(
+            env=SimpleNamespace(workspace="memory"),
+            da=SimpleNamespace(
+                SearchCursor=SearchCursor,
+                UpdateCursor=UpdateCursor,
+                InsertCursor=InsertCursor,
+            ),
+            management=SimpleNamespace(
+                GetCount=GetCount,
+                MakeTableView=MakeTableView,
+                DeleteRows=DeleteRows,
+                TruncateTable=TruncateTable,
+                Delete=Delete,
+            ),
+            ExecuteError=ExecuteError,
+            Describe=Describe,
+            ListFields=ListFields,
+            FromWKB=FromWKB,
+            SpatialReference=SpatialReference,
+            Point=Point,
+            PointGeometry=PointGeometry,
+        )
+        return arcpy
+
+    def _table(self, data_path: str) -> str:
+        name = re.split(r"[\\/]", data_path)[-1]
+        if name.upper() != "CITIES":
+            raise OSError(f"Dataset {data_path} does not exist.")
+        return "Cities"
+
+    def _columns(self, field: str) -> List[str]:
+        upper = field.upper()
+        if upper in ("SHAPE@", "SHAPE@XY"):
+            return ["SHAPE_X", "SHAPE_Y"]
+        if upper == "OID@":
+            return ["OBJECTID"]
+        return [field]
+
+    def _execute(self, statement: str, data_path: str) -> sqlite3.Cursor:
+        table, where_clause = self.views.get(data_path) or (self._table(data_path), "")
+        sql = f"{statement} FROM {table}"
+        if where_clause:
+            sql += f" WHERE {where_clause}"
+        return self.connection.execute(sql)
+
+    def _where(self, where_clause: Optional[str]) -> str:
+        return re.sub(r"\b(?:timestamp|date)\s+'", "'", where_clause or "", flags=re.I)
+
+    def _now(self) -> str:
+        return datetime.now().isoformat(sep=" ")
+
+    def _new_globalid(self) -> str:
+        return f"{{{str(uuid.uuid4()).upper()}}}"
+
+
+def _setup_workspace(scale: int) -> str:
+    try:
+        import arcpy  # noqa: F401
+    except ImportError:
+        sys.modules["arcpy"] = _StandIn(GEODATABASE, scale).module()
+        return "stand-in"
+
+    from archaic import Mapper
+
+    shutil.copyfile(GEODATABASE, BENCH_GEODATABASE)
+    arcpy.env.workspace = BENCH_GEODATABASE
+    mapper = Mapper("cities")
+    rows = list(mapper.read())
+    for _ in range(scale - 1):
+        mapper.insert_many(rows)
+    return "arcpy"
+
+
+@dataclasses.dataclass
+class ObjectID:
+    objectid: int = dataclasses.field(default=-1, init=False)
+
+
+@dataclasses.dataclass
+class GlobalID:
+    globalid: str = dataclasses.field(default="", init=False)
+
+
+@dataclass
+class Variant:
+    name: str
+    mapper: Any
+    create: Callable[[str, int], Any]
+    with_pop: Callable[[Any, int], Any]
+
+
+def _mutate(item: Any, pop: int) -> Any:
+    item.pop = pop
+    return item
+
+
+def _replace(item: Any, pop: int) -> Any:
+    # replace() resets init=False fields such as objectid to their defaults.
+    copy = dataclasses.replace(item, pop=pop)
+    for field in dataclasses.fields(item):
+        if not field.init:
+            object.__setattr__(copy, field.name, getattr(item, field.name))
+    return copy
+
+
+def _variants() -> List[Variant]:
+    from archaic import Mapper
+
+    @dataclass
+    class DataclassCity(ObjectID, GlobalID):
+        city_name: str
+        pop: int
+        shape: Any
+
+    @dataclass(slots=True)
+    class DataclassSlotsCity(ObjectID, GlobalID):
+        city_name: str
+        pop: int
+        shape: Any
+
+    @dataclass(frozen=True)
+    class DataclassFrozenCity:
+        objectid: int = dataclasses.field(default=-1, init=False)
+        globalid: str = dataclasses.field(default="", init=False)
+        city_name: str
+        pop: int
+        shape: Any
+
+    class PlainPythonCity(ObjectID, GlobalID):
+        city_name: str
+        pop: int
+        shape: Any
+
+        def __init__(
+            self, city_name: str = "", pop: int = 0, shape: Any = None
+        ) -> None:
+            self.city_name = city_name
+            self.pop = pop
+            self.shape = shape
+
+    def create_simplenamespace(name: str, pop: int) -> SimpleNamespace:
+        return SimpleNamespace(
+            objectid=-1, globalid="", city_name=name, pop=pop, shape=(-120, 50)
+        )
+
+    variants = [
+        Variant(
+            "dataclass",
+            Mapper[DataclassCity]("cities"),
+            lambda name, pop: DataclassCity(name, pop, (-120, 50)),
+            _mutate,
+        ),
+        Variant(
+            "dataclass_slots",
+            Mapper[DataclassSlotsCity]("cities"),
+            lambda name, pop: DataclassSlotsCity(name, pop, (-120, 50)),
+            _mutate,
+        ),
+        Variant(
+            "dataclass_frozen",
+            Mapper[DataclassFrozenCity]("cities"),
+            lambda name, pop: DataclassFrozenCity(name, pop, (-120, 50)),
+            _replace,
+        ),
+        Variant(
+            "plain_python",
+            Mapper[PlainPythonCity]("cities"),
+            lambda name, pop: PlainPythonCity(name, pop, (-120, 50)),
+            _mutate,
+        ),
+        Variant(
+            "simplenamespace",
+            Mapper(
+                "cities",
+                objectid="OBJECTID",
+                globalid="GlobalID",
+                city_name="city_name",
+                pop="pop",
+                shape="SHAPE",
+            ),
+            create_simplenamespace,
+            _mutate,
+        ),
+    ]
+
+    try:
+        import pydantic
+        import pydantic.dataclasses as pdc
+    except ImportError:
+        return variants
+
+    @pdc.dataclass(config=pydantic.ConfigDict(arbitrary_types_allowed=True))
+    class PydanticDataclassCity(ObjectID, GlobalID):
+        city_name: str
+        pop: int
+        shape: Any
+
+    class PydanticModelCity(pydantic.BaseModel):
+        objectid: int = -1
+        globalid: str = ""
+        city_name: str
+        pop: int
+        shape: Any
+
+    variants.append(
+        Variant(
+            "pydantic_dataclass",
+            Mapper[PydanticDataclassCity]("cities"),
+            lambda name, pop: PydanticDataclassCity(
+                city_name=name, pop=pop, shape=(-120, 50)
+            ),
+            _mutate,
+        )
+    )
+    variants.append(
+        Variant(
+            "pydantic_model",
+            Mapper[PydanticModelCity]("cities"),
+            lambda name, pop: PydanticModelCity(
+                city_name=name, pop=pop, shape=(-120, 50)
+            ),
+            _mutate,
+        )
+    )
+    return variants
+
+
+class _Timings:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.rows: Dict[str, int] = {}
+
+    def measure(
+        self, operation: str, action: Callable[[], Any], rows: Optional[int] = None
+    ) -> Any:
+        start = time.perf_counter()
+        result = action()
+        self.samples.setdefault(operation, []).append(time.perf_counter() - start)
+        self.rows[operation] = len(result) if isinstance(result, list) else 1
+        if rows is not None and self.rows[operation] < rows:
+            raise RuntimeError(
+                f"{operation} wrote {self.rows[operation]} of {rows} rows."
+            )
+        return result
+
+
+def _run_variant(variant: Variant, repeat: int, batch: int) -> _Timings:
+    from archaic.archaic import to_sql
+
+    mapper = variant.mapper
+    timings = _Timings()
+    mapper.delete_where(f"city_name LIKE '{PREFIX}%'")
+    oids = [x.objectid for x in mapper.read("pop > 1000000")][:100]
+
+    # to_sql picks the first lambda on a line, so predicates get their own line.
+    predicate = lambda c: c.city_name.startswith("St") and c.pop > 100_000  # noqa: E731
+    by_pop_lambda = lambda c: c.pop > 1_000_000  # noqa: E731
+    properties = mapper.info.properties
+
+    for i in range(repeat):
+        timings.measure("read", lambda: list(mapper.read()))
+        timings.measure("read_where", lambda: list(mapper.read("pop > 1000000")))
+        timings.measure("read_lambda", lambda: list(mapper.read(by_pop_lambda)))
+        timings.measure("get", lambda: [mapper.get(x) for x in oids])
+        timings.measure(
+            "to_sql", lambda: [to_sql(predicate, properties) for _ in range(100)]
+        )
+
+        items = [variant.create(f"{PREFIX}{i}:{n}", n) for n in range(batch)]
+        ids = timings.measure(
+            "insert_many", lambda: mapper.insert_many(items), rows=batch
+        )
+        inserted = list(mapper.read(ids))
+        timings.measure(
+            "update",
+            lambda: mapper.update([variant.with_pop(x, x.pop + 1) for x in inserted]),
+            rows=batch,
+        )
+        timings.measure(
+            "update_where",
+            lambda: mapper.update_where(
+                f"city_name LIKE '{PREFIX}%'",
+                lambda x: variant.with_pop(x, x.pop + 1),
+            ),
+            rows=batch,
+        )
+        timings.measure("delete", lambda: mapper.delete(ids), rows=batch)
+
+        mapper.insert_many(items)
+        timings.measure(
+            "delete_where",
+            lambda: mapper.delete_where(f"city_name LIKE '{PREFIX}%'"),
+            rows=batch,
+        )
+
+    return timings
+
+
+def run(scale: int, repeat: int, batch: int) -> Dict[str, Any]:
+    backend = _setup_workspace(scale)
+    results: List[Dict[str, Any]] = []
+    for variant in _variants():
+        timings = _run_variant(variant, repeat, batch)
+        for operation, samples in timings.samples.items():
+            median = statistics.median(samples)
+            rows = timings.rows[operation]
+            results.append(
+                {
+                    "model": variant.name,
+                    "operation": operation,
+                    "rows": rows,
+                    "median_s": median,
+                    "min_s": min(samples),
+                    "max_s": max(samples),
+                    "per_row_us": median / max(rows, 1) * 1e6,
+                }
+            )
+    return {
+        "meta": {
+            "backend": backend,
+            "scale": scale,
+            "repeat": repeat,
+            "batch": batch,
+            "python": platform.python_version(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    default_threshold: float,
+    thresholds: Dict[str, float],
+) -> List[str]:
+    """Compares median timings against a baseline.
+
+    Args:
+        current: Results of this run.
+        baseline: Results of a previous run.
+        default_threshold: Allowed ratio of current to baseline median.
+        thresholds: Allowed ratio per operation, overriding the default.
+
+    Returns:
+        List[str]: Descriptions of regressions.
+    """
+    previous = {(r["model"], r["operation"]): r for r in baseline["results"]}
+    regressions: List[str] = []
+    for result in current["results"]:
+        before = previous.get((result["model"], result["operation"]))
+        if not before or not before["median_s"]:
+            continue
+        ratio = result["median_s"] / before["median_s"]
+        threshold = thresholds.get(result["operation"], default_threshold)
+        if ratio > threshold:
+            regressions.append(
+                f"{result['model']}.{result['operation']}: {ratio:.2f}x "
+                f"({before['median_s'] * 1e3:.2f} ms -> {result['median_s'] * 1e3:.2f} ms, "
+                f"threshold {threshold:.2f}x)"
+            )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks archaic's Mapper.")
+    parser.add_argument("--scale", type=int, default=1, help="Copies of Cities.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per operation.")
+    parser.add_argument("--batch", type=int, default=1000, help="Rows per write.")
+    parser.add_argument("--output", help="Writes results as JSON to this path.")
+    parser.add_argument("--baseline", help="Compares against this results file.")
+    parser.add_argument(
+        "--threshold",
+        action="append",
+        default=[],
+        help="Allowed slowdown ratio, e.g. 1.25 or read=1.5 (repeatable).",
+    )
+    args = parser.parse_args(argv)
+
+    default_threshold = 1.25
+    thresholds: Dict[str, float] = {}
+    for threshold in args.threshold:
+        operation, _, ratio = threshold.rpartition("=")
+        if operation:
+            thresholds[operation] = float(ratio)
+        else:
+            default_threshold = float(ratio)
+
+    current = run(args.scale, args.repeat, args.batch)
+    text = json.dumps(current, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, default_threshold, thresholds)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
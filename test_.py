@@ -1,14 +1,18 @@
-from datetime import datetime
+from datetime import date, datetime
 
 import arcpy
 import dataclasses
 import pytest
 import shutil
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from types import SimpleNamespace
 from typing import Any, Callable, Optional
 
-from archaic import Mapper
+from archaic import Mapper, QueryCache, Stats, WatermarkStore
+from archaic.archaic import to_sql
 
 
 def _setup_workspace() -> None:
@@ -392,3 +396,424 @@ def test_crud_simplenamespace_city():
     _read(mapper)
     _read_via_lambda(mapper)
     _crud(mapper, create_city, "city_name LIKE 'CRUD:%'")
+
+
+def test_observe_stats():
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        pop: int
+
+    mapper = Mapper[City]("cities")
+    stats = Stats()
+    unobserve = mapper.observe(stats)
+
+    cities = list(mapper.read(lambda c: c.pop > 1_000_000))
+    mapper.get(cities[0].objectid)
+    list(mapper.read([c.objectid for c in cities] * 3))
+
+    summary = stats.summary()
+    assert summary["read"]["calls"] == 2
+    assert summary["read"]["rows_yielded"] == len(cities) * 2
+    assert summary["read"]["id_chunks"] == -(-len(cities) * 3 // 1000)
+    assert "to_sql" in summary["read"]["phases"]
+    assert summary["get"]["cursors"] == 1
+    assert summary["get"]["rows_yielded"] == 1
+
+    unobserve()
+    list(mapper.read("pop > 1000000"))
+    assert stats.summary()["read"]["calls"] == 2
+
+
+def test_observe_failing_observer(caplog):
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+
+    def fail(event):
+        raise RuntimeError("metrics are down")
+
+    mapper = Mapper[City]("cities")
+    mapper.observe(fail)
+    city = next(iter(mapper.read()))
+
+    assert mapper.get(city.objectid).objectid == city.objectid
+    assert "metrics are down" in caplog.text
+
+
+def test_read_include_relationship():
+    @dataclass
+    class Neighbour(ObjectID):
+        city_name: str
+        cntry_name: str
+
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        cntry_name: str
+        neighbours: list = dataclasses.field(default_factory=list)
+
+    cities = Mapper[City]("cities")
+    cities.relate("neighbours", Mapper[Neighbour]("cities"), "cntry_name", many=True)
+    stats = Stats()
+    cities.observe(stats)
+
+    items = list(cities.read("cntry_name LIKE 'C%'", include="neighbours"))
+    assert items
+    for city in items:
+        assert city.objectid in {x.objectid for x in city.neighbours}
+        assert all(x.cntry_name == city.cntry_name for x in city.neighbours)
+    assert stats.summary()["read"]["cursors"] <= 1 + -(-len(items) // 1000) * 2
+
+
+def test_read_changes(tmp_path):
+    @dataclass
+    class City(ObjectID, EditTracking):
+        city_name: str
+        pop: int
+        shape: Any
+
+    mapper = Mapper[City]("cities")
+    mapper.delete_where("city_name LIKE 'CHANGES:%'")
+    store = WatermarkStore(str(tmp_path / "watermarks.json"))
+
+    feed = mapper.read_changes(since=store.load("cities"))
+    assert all(x.kind == "insert" for x in feed)
+    store.save("cities", feed.watermark)
+
+    ids = mapper.insert_many(
+        [City("CHANGES:a", 1, (-120, 50)), City("CHANGES:b", 2, (-120, 50))]
+    )
+    feed = mapper.read_changes(since=store.load("cities"))
+    assert {(x.kind, x.id) for x in feed} == {("insert", id) for id in ids}
+    store.save("cities", feed.watermark)
+
+    mapper.delete(ids[1])
+    feed = mapper.read_changes(since=store.load("cities"))
+    assert [(x.kind, x.id) for x in feed] == [("delete", ids[1])]
+    store.save("cities", feed.watermark)
+
+    assert list(mapper.read_changes(since=store.load("cities"))) == []
+    mapper.delete(ids)
+
+
+def test_upsert_many():
+    @dataclass
+    class City(ObjectID, GlobalID):
+        city_name: str
+        pop: int
+        shape: Any
+
+    mapper = Mapper[City]("cities")
+    mapper.delete_where("city_name LIKE 'UPSERT:%'")
+    mapper.insert_many(
+        [City("UPSERT:a", 1, (-120, 50)), City("UPSERT:b", 2, (-120, 50))]
+    )
+
+    counts = mapper.upsert_many(
+        [
+            City("UPSERT:b", 20, (-120, 50)),
+            City("UPSERT:c", 3, (-120, 50)),
+            City("UPSERT:c", 30, (-120, 50)),
+        ],
+        key="city_name",
+    )
+    assert counts == {"inserted": 1, "updated": 1, "deleted": 0}
+
+    cities = {c.city_name: c.pop for c in mapper.read("city_name LIKE 'UPSERT:%'")}
+    assert cities == {"UPSERT:a": 1, "UPSERT:b": 20, "UPSERT:c": 30}
+
+    existing = next(iter(mapper.read("city_name = 'UPSERT:a'")))
+    existing.pop = 10
+    counts = mapper.upsert_many(
+        [existing, *(City(f"UPSERT:g{i}", i, (-120, 50)) for i in range(3))],
+        key="globalid",
+    )
+    assert counts == {"inserted": 3, "updated": 1, "deleted": 0}
+    assert len(list(mapper.read("city_name LIKE 'UPSERT:g%'"))) == 3
+    assert next(iter(mapper.read("city_name = 'UPSERT:a'"))).pop == 10
+
+    mapper.delete_where("city_name LIKE 'UPSERT:%'")
+
+
+def test_sample():
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        pop: int
+        status: str
+
+    mapper = Mapper[City]("cities")
+
+    sample = mapper.sample(25, seed=1)
+    assert len({c.objectid for c in sample}) == 25
+    assert [c.objectid for c in mapper.sample(25, seed=1)] == [
+        c.objectid for c in sample
+    ]
+
+    sample = mapper.sample(10, filter=lambda c: c.pop > 1_000_000, seed=2)
+    assert len(sample) == 10 and all(c.pop > 1_000_000 for c in sample)
+
+    counts = Counter(c.status for c in mapper.read())
+    total = sum(counts.values())
+    sample = mapper.sample(100, stratify_by="status", seed=3)
+    assert len(sample) == 100
+    for status, count in Counter(c.status for c in sample).items():
+        assert abs(count - 100 * counts[status] / total) < 1
+    statuses = [c.status for c in sample]
+    changes = sum(a != b for a, b in zip(statuses, statuses[1:]))
+    assert changes > len(set(statuses)) - 1
+
+
+def test_load_schema(tmp_path):
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        pop: int
+
+    path = str(tmp_path / "cities.json")
+    snapshot = Mapper[City]("cities").export_schema(path)
+
+    stats = Stats()
+    mapper = Mapper[City]("cities")
+    mapper.observe(stats)
+    mapper.load_schema(path)
+    assert mapper.info.properties == Mapper[City]("cities").info.properties
+    assert next(iter(mapper.read()))
+    assert "describe" not in stats.summary()
+
+    with pytest.raises(ValueError):
+        Mapper[City]("countries").load_schema(snapshot, validate=False)
+
+    # Real catalog paths are absolute and may be owner-qualified.
+    qualified = {**snapshot, "data_path": "C:/gis/world.sde/gis.OWNER.Cities"}
+    Mapper[City]("cities").load_schema(qualified, validate=False)
+    Mapper[City]("C:\\gis\\world.sde\\gis.owner.cities").load_schema(
+        qualified, validate=False
+    )
+    with pytest.raises(ValueError):
+        Mapper[City]("countries").load_schema(qualified, validate=False)
+    with pytest.raises(ValueError):
+        Mapper[City]("cities").load_schema(
+            {**qualified, "workspace": "C:/gis/other.gdb"}, validate=False
+        )
+
+    stale = {**snapshot, "fields": snapshot["fields"][:-1]}
+    with pytest.raises(ValueError):
+        Mapper[City]("cities").load_schema(stale)
+
+    @dataclass
+    class Town(ObjectID):
+        town_name: str
+
+    with pytest.raises(ValueError):
+        Mapper[Town]("cities").load_schema(snapshot, validate=False)
+
+
+def test_delete_set_based():
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        pop: int
+        shape: Any
+
+    mapper = Mapper[City]("cities")
+    mapper.delete_where("city_name LIKE 'DELETE:%'")
+    ids = mapper.insert_many([City(f"DELETE:{i}", i, (-120, 50)) for i in range(8)])
+    stats = Stats()
+    mapper.observe(stats)
+
+    assert mapper.delete(ids[0]) == [ids[0]]
+    assert stats.summary()["delete"]["cursors"] == 1
+
+    assert sorted(mapper.delete(ids[1:4], set_based_threshold=2)) == ids[1:4]
+    assert mapper.delete(ids[4:6], return_ids=False, set_based_threshold=2) == 2
+    assert "delete_rows" in stats.summary()["delete"]["phases"]
+
+    assert (
+        sorted(
+            mapper.delete_where("city_name LIKE 'DELETE:%'", set_based_threshold=None)
+        )
+        == ids[6:]
+    )
+    assert mapper.delete_where(lambda c: c.pop < 0, return_ids=False) == 0
+
+
+_NAMES = ["Tokyo", "O'Hare"]
+_LOW, _HIGH = 10, 20
+
+
+@pytest.mark.parametrize(
+    "predicate, sql",
+    [
+        (lambda c: c.pop > 100_000, "POP > 100000"),
+        (lambda c: c.pop in [1, 2, 3], "POP IN (1, 2, 3)"),
+        (lambda c: c.city_name in {"Tokyo"}, "CITY_NAME IN ('Tokyo')"),
+        (lambda c: c.city_name in _NAMES, "CITY_NAME IN ('Tokyo', 'O''Hare')"),
+        (lambda c: c.city_name not in _NAMES, "CITY_NAME NOT IN ('Tokyo', 'O''Hare')"),
+        (lambda c: c.city_name in [], "1 = 0"),
+        (lambda c: c.status in [None, "x"], "(STATUS IN ('x') OR STATUS IS NULL)"),
+        (lambda c: _LOW <= c.pop <= _HIGH, "POP BETWEEN 10 AND 20"),
+        (lambda c: _HIGH >= c.pop >= _LOW, "POP BETWEEN 10 AND 20"),
+        (lambda c: _LOW < c.pop < _HIGH, "(10 < POP AND POP < 20)"),
+        (lambda c: not c.pop > 5, "NOT (POP > 5)"),
+        (lambda c: c.pop * 2 + 1 > 5, "((POP * 2) + 1) > 5"),
+        (lambda c: c.pop % 2 == 0, "MOD(POP, 2) = 0"),
+        (lambda c: c.status is None, "STATUS IS NULL"),
+        (lambda c: c.status is not None, "STATUS IS NOT NULL"),
+        (lambda c: c.status == None, "STATUS IS NULL"),  # noqa: E711
+        (lambda c: c.city_name.upper() == "TOKYO", "UPPER(CITY_NAME) = 'TOKYO'"),
+        (lambda c: c.city_name.lower().startswith("to"), "LOWER(CITY_NAME) LIKE 'to%'"),
+        (lambda c: c.city_name.endswith("o"), "CITY_NAME LIKE '%o'"),
+        (lambda c: "o'k" in c.city_name, "CITY_NAME LIKE '%o''k%'"),
+        (
+            lambda c: c.city_name.startswith("5%_"),
+            "CITY_NAME LIKE '5\\%\\_%' ESCAPE '\\'",
+        ),
+        (lambda c: c.city_name == "O'Hare", "CITY_NAME = 'O''Hare'"),
+        (
+            lambda c: c.created_date.year == 2024 and c.created_date.month > 6,
+            "(EXTRACT(YEAR FROM created_date) = 2024"
+            " AND EXTRACT(MONTH FROM created_date) > 6)",
+        ),
+        (
+            lambda c: c.created_date > datetime(2024, 1, 2, 3, 4, 5),
+            "created_date > timestamp '2024-01-02 03:04:05'",
+        ),
+        (
+            lambda c: c.created_date > date(2024, 1, 2),
+            "created_date > date '2024-01-02'",
+        ),
+        (
+            lambda c: c.pop > len(_NAMES) and (c.status == "A" or c.status == "B"),
+            "(POP > 2 AND (STATUS = 'A' OR STATUS = 'B'))",
+        ),
+    ],
+)
+def test_to_sql(predicate: Callable[[Any], bool], sql: str):
+    properties = {
+        "city_name": "CITY_NAME",
+        "pop": "POP",
+        "status": "STATUS",
+        "created_date": "created_date",
+    }
+    assert to_sql(predicate, properties) == sql
+
+
+def test_to_sql_unsupported():
+    with pytest.raises(ValueError):
+        to_sql(lambda c: c.city_name.strip() == "x", {"city_name": "CITY_NAME"})
+    with pytest.raises(ValueError):
+        to_sql(lambda c: c.status in "AB", {"status": "STATUS"})
+
+
+def test_read_cache(tmp_path):
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        pop: int
+        shape: Any
+
+    mapper = Mapper[City]("cities")
+    mapper.delete_where("city_name LIKE 'CACHE:%'")
+    cache = QueryCache(str(tmp_path))
+    stats = Stats()
+    mapper.observe(stats)
+
+    cities = list(mapper.read(lambda c: c.pop > 1_000_000, 3857, cache=cache))
+    cached = list(mapper.read(lambda c: c.pop > 1_000_000, 3857, cache=cache))
+    # The default change token of a non-folder workspace opens one cursor per read.
+    assert stats.summary()["read"]["cursors"] == 3
+    assert [(c.objectid, c.pop) for c in cached] == [
+        (c.objectid, c.pop) for c in cities
+    ]
+    assert cached[0].shape.spatialReference.factoryCode == 3857
+    assert cached[0].shape.WKT == cities[0].shape.WKT
+
+    untracked = Mapper[City]("cities")
+    untracked.info.edited_at_field = None
+    with pytest.raises(ValueError):
+        list(untracked.read(cache=cache))
+
+    stats.reset()
+    fixed = QueryCache(str(tmp_path / "fixed"), token=lambda _: "1")
+    for _ in range(2):
+        list(mapper.read(lambda c: c.pop > 1_000_000, cache=fixed))
+    assert stats.summary()["read"]["cursors"] == 1
+
+    id = mapper.insert_many([City("CACHE:a", 2_000_000, (-120, 50))])[0]
+    assert (
+        len(list(mapper.read(lambda c: c.pop > 1_000_000, cache=cache)))
+        == len(cities) + 1
+    )
+    mapper.delete(id)
+
+
+def test_writer_from_threads():
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        pop: int
+        shape: Any
+
+    mapper = Mapper[City]("cities")
+    mapper.delete_where("city_name LIKE 'WRITER:%'")
+
+    with mapper.writer(batch_size=50, flush_interval=0.1, max_queue=20) as writer:
+        with ThreadPoolExecutor(4) as executor:
+            futures = [
+                f
+                for fs in executor.map(
+                    lambda k: writer.submit_many(
+                        City(f"WRITER:{k}:{i}", i, (-120, 50)) for i in range(100)
+                    ),
+                    range(4),
+                )
+                for f in fs
+            ]
+
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    with pytest.raises(RuntimeError):
+        writer.submit(City("WRITER:closed", 0, (-120, 50)))
+
+    ids = [f.result() for f in futures]
+    assert len(set(ids)) == 400
+    assert len(list(mapper.read(ids))) == 400
+    mapper.delete(ids)
+
+    with mapper.writer(flush_interval=None) as pending:
+        future = pending.submit(City("WRITER:pending", 0, (-120, 50)))
+        time.sleep(0.1)
+        assert not future.done()
+        pending.flush()
+        assert future.done()
+    mapper.delete(future.result())
+
+
+def test_spatial_index():
+    np = pytest.importorskip("numpy")
+
+    @dataclass
+    class City(ObjectID):
+        city_name: str
+        shape: Any
+
+    mapper = Mapper[City]("cities")
+    index = mapper.spatial_index(wkid=3857)
+    assert len(index) > 0
+
+    xy = (-8836000.0, 5411000.0)
+    distances = np.hypot(*(index.xy - xy).T)
+    expected = index.ids[np.argsort(distances, kind="stable")].tolist()
+
+    assert index.nearest(xy, k=5) == expected[:5]
+    assert index.within_radius(xy, 500_000) == expected[: (distances <= 500_000).sum()]
+
+    inside = index.within_bbox(xy[0] - 1e6, xy[1] - 1e6, xy[0] + 1e6, xy[1] + 1e6)
+    mask = (np.abs(index.xy - xy) <= 1e6).all(axis=1)
+    assert set(inside) == set(index.ids[mask].tolist())
+
+    nearest = index.nearest(xy, k=3, hydrate=True)
+    assert [c.objectid for c in nearest] == expected[:3]
+    assert nearest[0].shape.spatialReference.factoryCode == 3857